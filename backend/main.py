@@ -4,28 +4,138 @@ NYC Taxi Data Analytics - FastAPI Backend
 RESTful API for 8 analytical features
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from pydantic import BaseModel
 import duckdb
+import orjson
+import pyarrow as pa
+import pyarrow.compute as pc
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Literal
+from contextlib import contextmanager
+from functools import wraps
+import hashlib
+import io
 import logging
+import os
+import queue
+import time
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class OrjsonResponse(JSONResponse):
+    """JSON response encoded by orjson's C encoder instead of the json module
+
+    Replaces FastAPI's deprecated ORJSONResponse. Routes with a response_model
+    still validate their payload against it before render() is called.
+    """
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
 # Initialize FastAPI app
 app = FastAPI(
     title="NYC Taxi Analytics API",
     description="Analytics API for NYC Taxi Trip Data (24M+ trips)",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=OrjsonResponse
 )
 
+# Compress larger responses (e.g. top routes / anomalies at high limits) for
+# clients that send Accept-Encoding: gzip
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+# Database path
+DB_PATH = Path(__file__).parent.parent / "data" / "taxi_analytics.duckdb"
+
+# Connection pool - DuckDB executes one query at a time per connection,
+# so independent read-only connections let concurrent requests run in parallel
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+_db_pool = queue.Queue(maxsize=DB_POOL_SIZE)
+
+try:
+    for _ in range(DB_POOL_SIZE):
+        _db_pool.put(duckdb.connect(str(DB_PATH), read_only=True))
+except Exception as e:
+    logger.error(f"Database connection failed: {e}")
+    raise
+
+@contextmanager
+def acquire_conn():
+    """Borrow a database connection from the pool for the duration of a request"""
+    con = _db_pool.get()
+    try:
+        yield con
+    finally:
+        _db_pool.put(con)
+
+@app.on_event("shutdown")
+def close_db_pool():
+    """Close all pooled database connections"""
+    while not _db_pool.empty():
+        _db_pool.get_nowait().close()
+
+# Response cache - the database is read-only, so results of the full-scan
+# summary endpoints stay valid until the ETL rebuilds the database
+CACHE_TTL_SECONDS = 3600
+_response_cache: Dict[Any, Any] = {}
+
+def ttl_cache(ttl: Optional[float] = CACHE_TTL_SECONDS):
+    """Cache an endpoint's response keyed by its query parameters (ttl=None never expires)"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(**kwargs):
+            key = (func.__name__, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            cached = _response_cache.get(key)
+            if cached is not None and (cached[0] is None or now < cached[0]):
+                return cached[1]
+
+            result = func(**kwargs)
+            expires_at = None if ttl is None else now + ttl
+            _response_cache[key] = (expires_at, result)
+            return result
+        return wrapper
+    return decorator
+
+# HTTP caching - since the database is read-only, a response is determined by
+# its URL and the database file version, so clients can revalidate with ETags
+HTTP_CACHE_CONTROL = f"public, max-age={CACHE_TTL_SECONDS}, stale-while-revalidate=86400"
+DB_VERSION = DB_PATH.stat().st_mtime_ns.to_bytes(8, "little")
+
+def is_cacheable_path(path: str) -> bool:
+    """Whether a path serves database data (not /docs or /openapi.json)"""
+    return path == "/stats" or path.startswith("/api/")
+
+@app.middleware("http")
+async def add_http_cache_headers(request: Request, call_next):
+    """Set ETag/Cache-Control on GET responses and answer matching If-None-Match with 304"""
+    if request.method != "GET" or not is_cacheable_path(request.url.path):
+        return await call_next(request)
+
+    url_key = f"{request.url.path}?{request.url.query}".encode()
+    # Weak validator: GZipMiddleware may serve the same body with different encodings
+    etag = f'W/"{hashlib.blake2b(DB_VERSION + url_key, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": HTTP_CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    response = await call_next(request)
+    if response.status_code == 200:
+        response.headers.update(headers)
+    return response
+
 # CORS middleware for frontend
 # For development - allows local file access
 # For production, use environment variable: ALLOWED_ORIGINS="http://yourdomain.com"
-import os
+# Added after the ETag middleware so it is the outer layer and its headers
+# also reach the 304 responses answered there
 allowed_origins = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 app.add_middleware(
     CORSMiddleware,
@@ -35,16 +145,89 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database path
-DB_PATH = Path(__file__).parent.parent / "data" / "taxi_analytics.duckdb"
-
-def get_db_connection():
-    """Get database connection"""
-    try:
-        return duckdb.connect(str(DB_PATH), read_only=True)
-    except Exception as e:
-        logger.error(f"Database connection failed: {e}")
-        raise HTTPException(status_code=500, detail="Database connection failed")
+# Arrow IPC output - large tabular endpoints accept ?format=arrow and return
+# DuckDB's columnar result directly instead of building JSON row by row
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+ResponseFormat = Literal["json", "arrow"]
+
+def arrow_response(table: pa.Table) -> Response:
+    """Serialize an Arrow table as an Arrow IPC stream response"""
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return Response(content=sink.getvalue().to_pybytes(), media_type=ARROW_STREAM_MEDIA_TYPE)
+
+ARROW_BATCH_ROWS = 1024
+
+def arrow_stream_response(sql: str, params: List[Any]) -> StreamingResponse:
+    """Run a query and stream its result as Arrow IPC record batches
+
+    The pooled connection is held by the generator until the last batch is
+    sent, so bytes go out while DuckDB is still producing rows.
+    """
+    def generate():
+        with acquire_conn() as con:
+            reader = con.execute(sql, params).fetch_record_batch(ARROW_BATCH_ROWS)
+            buf = io.BytesIO()
+            with pa.ipc.new_stream(buf, reader.schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+                    yield buf.getvalue()
+                    buf.seek(0)
+                    buf.truncate()
+            yield buf.getvalue()
+
+    return StreamingResponse(generate(), media_type=ARROW_STREAM_MEDIA_TYPE)
+
+def fetch_records(cursor, round_to: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
+    """Fetch a query result as a list of row dicts keyed by column alias.
+
+    The result is materialized column-wise through Arrow rather than as one
+    Python tuple per row, so SQL aliases must match the JSON field names.
+    Columns in round_to are rounded to the given number of decimals here
+    (vectorized over the fetched rows) instead of per scanned row in SQL.
+    """
+    table = cursor.fetch_arrow_table()
+    for name, ndigits in (round_to or {}).items():
+        column = table[name]
+        # Round in double precision so FLOAT columns (e.g. medians) match DuckDB's ROUND.
+        # Arrow's "towards infinity" means away from zero (-2.5 -> -3), the same
+        # tie rule as ROUND; pyarrow has no mode named "half_away_from_zero"
+        rounded = pc.round(column.cast(pa.float64()), ndigits, round_mode="half_towards_infinity")
+        table = table.set_column(table.schema.get_field_index(name), name, rounded.cast(column.type))
+    return table.to_pylist()
+
+# Response models for the highest-volume endpoints. Besides documenting the
+# payload in the OpenAPI schema, FastAPI validates the returned rows against
+# them before OrjsonResponse encodes the result.
+
+class Route(BaseModel):
+    model_config = {"extra": "ignore"}
+
+    origin: str
+    destination: str
+    trip_count: int
+    avg_fare: float
+    avg_distance: float
+    avg_duration_min: float
+
+class RoutesResponse(BaseModel):
+    top_routes: List[Route]
+
+class HighFareAnomaly(BaseModel):
+    model_config = {"extra": "ignore"}
+
+    trip_id: int
+    pickup_datetime: str
+    pickup_zone: str
+    dropoff_zone: str
+    fare_amount: float
+    trip_distance: float
+    fare_per_mile: float
+    duration_min: float
+
+class HighFareAnomaliesResponse(BaseModel):
+    anomalies: List[HighFareAnomaly]
 
 @app.get("/")
 async def root():
@@ -66,10 +249,10 @@ async def root():
     }
 
 @app.get("/stats")
-async def get_statistics():
+@ttl_cache(ttl=None)
+def get_statistics():
     """Get overall database statistics"""
-    con = get_db_connection()
-    try:
+    with acquire_conn() as con:
         stats = con.execute("""
             SELECT
                 total_trips,
@@ -93,255 +276,236 @@ async def get_statistics():
                 "end": str(stats[6])
             }
         }
-    finally:
-        con.close()
 
 # ============================================================
 # FEATURE 1: ZONE POPULARITY RANKING
 # ============================================================
 
+TOP_PICKUP_ZONES_SQL = """
+    SELECT
+        zone,
+        borough,
+        pickup_count,
+        avg_fare,
+        avg_distance,
+        median_fare
+    FROM mv_zone_pickup
+    WHERE is_manhattan
+    ORDER BY pickup_count DESC
+    LIMIT ?
+"""
+
 @app.get("/api/zones/top-pickup")
-async def get_top_pickup_zones(limit: int = 20):
+def get_top_pickup_zones(limit: int = Query(20, ge=1, le=1000)):
     """Get top N pickup zones by trip count"""
-    # Input validation - validates limit is safe integer
-    if not isinstance(limit, int) or not (1 <= limit <= 1000):
-        raise HTTPException(status_code=400, detail="Limit must be between 1 and 1000")
-
-    con = get_db_connection()
-    try:
-        # Note: LIMIT uses f-string since it's validated as safe integer (not user string input)
-        result = con.execute(f"""
-            SELECT
-                l.zone,
-                l.borough,
-                z.pickup_count,
-                ROUND(z.avg_fare, 2) as avg_fare,
-                ROUND(z.avg_distance, 2) as avg_distance,
-                ROUND(z.median_fare, 2) as median_fare
-            FROM mv_zone_pickup z
-            JOIN dim_location l ON z.location_id = l.location_id
-            WHERE l.borough = 'Manhattan'
-            ORDER BY z.pickup_count DESC
-            LIMIT {limit}
-        """).fetchall()
-
-        return {
-            "zones": [
-                {
-                    "zone": row[0],
-                    "borough": row[1],
-                    "pickup_count": row[2],
-                    "avg_fare": row[3],
-                    "avg_distance": row[4],
-                    "median_fare": row[5]
-                }
-                for row in result
-            ]
-        }
-    finally:
-        con.close()
+    with acquire_conn() as con:
+        cursor = con.execute(TOP_PICKUP_ZONES_SQL, [limit])
+        records = fetch_records(cursor, round_to={
+            "avg_fare": 2,
+            "avg_distance": 2,
+            "median_fare": 2
+        })
+        return {"zones": records}
+
+TOP_DROPOFF_ZONES_SQL = """
+    SELECT
+        zone,
+        borough,
+        dropoff_count,
+        avg_fare,
+        avg_distance
+    FROM mv_zone_dropoff
+    WHERE is_manhattan
+    ORDER BY dropoff_count DESC
+    LIMIT ?
+"""
 
 @app.get("/api/zones/top-dropoff")
-async def get_top_dropoff_zones(limit: int = 20):
+def get_top_dropoff_zones(limit: int = Query(20, ge=1, le=1000)):
     """Get top N dropoff zones by trip count"""
-    # Input validation - validates limit is safe integer
-    if not isinstance(limit, int) or not (1 <= limit <= 1000):
-        raise HTTPException(status_code=400, detail="Limit must be between 1 and 1000")
-
-    con = get_db_connection()
-    try:
-        # Note: LIMIT uses f-string since it's validated as safe integer (not user string input)
-        result = con.execute(f"""
-            SELECT
-                l.zone,
-                l.borough,
-                z.dropoff_count,
-                ROUND(z.avg_fare, 2) as avg_fare,
-                ROUND(z.avg_distance, 2) as avg_distance
-            FROM mv_zone_dropoff z
-            JOIN dim_location l ON z.location_id = l.location_id
-            WHERE l.borough = 'Manhattan'
-            ORDER BY z.dropoff_count DESC
-            LIMIT {limit}
-        """).fetchall()
-
-        return {
-            "zones": [
-                {
-                    "zone": row[0],
-                    "borough": row[1],
-                    "dropoff_count": row[2],
-                    "avg_fare": row[3],
-                    "avg_distance": row[4]
-                }
-                for row in result
-            ]
-        }
-    finally:
-        con.close()
+    with acquire_conn() as con:
+        cursor = con.execute(TOP_DROPOFF_ZONES_SQL, [limit])
+        records = fetch_records(cursor, round_to={
+            "avg_fare": 2,
+            "avg_distance": 2
+        })
+        return {"zones": records}
 
 # ============================================================
 # FEATURE 2: TEMPORAL DEMAND CALENDAR
 # ============================================================
 
+# Day names indexed by DuckDB's day-of-week number (0 = Sunday)
+DAYS = ("Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday")
+
 @app.get("/api/temporal/hourly")
-async def get_hourly_demand():
+def get_hourly_demand():
     """Get trip demand by hour of day"""
-    con = get_db_connection()
-    try:
-        result = con.execute("""
+    with acquire_conn() as con:
+        cursor = con.execute("""
             SELECT
-                pickup_hour,
-                SUM(trip_count) as total_trips,
-                ROUND(AVG(avg_fare), 2) as avg_fare,
-                ROUND(SUM(total_revenue), 2) as total_revenue
+                pickup_hour as hour,
+                SUM(trip_count)::BIGINT as total_trips,
+                AVG(avg_fare) as avg_fare,
+                SUM(total_revenue) as total_revenue
             FROM mv_hourly_demand
             GROUP BY pickup_hour
             ORDER BY pickup_hour
-        """).fetchall()
-
-        return {
-            "hourly_data": [
-                {
-                    "hour": row[0],
-                    "total_trips": row[1],
-                    "avg_fare": row[2],
-                    "total_revenue": row[3]
-                }
-                for row in result
-            ]
-        }
-    finally:
-        con.close()
+        """)
+        records = fetch_records(cursor, round_to={
+            "avg_fare": 2,
+            "total_revenue": 2
+        })
+        return {"hourly_data": records}
 
 @app.get("/api/temporal/day-of-week")
-async def get_day_of_week_demand():
+def get_day_of_week_demand():
     """Get trip demand by day of week"""
-    con = get_db_connection()
-    try:
-        result = con.execute("""
+    with acquire_conn() as con:
+        cursor = con.execute("""
             SELECT
-                pickup_day_of_week,
-                CASE pickup_day_of_week
-                    WHEN 0 THEN 'Sunday'
-                    WHEN 1 THEN 'Monday'
-                    WHEN 2 THEN 'Tuesday'
-                    WHEN 3 THEN 'Wednesday'
-                    WHEN 4 THEN 'Thursday'
-                    WHEN 5 THEN 'Friday'
-                    WHEN 6 THEN 'Saturday'
-                END as day_name,
+                pickup_day_of_week as day_number,
                 is_weekend,
-                SUM(trip_count) as total_trips,
-                ROUND(AVG(avg_fare), 2) as avg_fare
+                SUM(trip_count)::BIGINT as total_trips,
+                AVG(avg_fare) as avg_fare
             FROM mv_hourly_demand
             GROUP BY pickup_day_of_week, is_weekend
             ORDER BY pickup_day_of_week
-        """).fetchall()
-
-        return {
-            "day_of_week_data": [
-                {
-                    "day_number": row[0],
-                    "day_name": row[1],
-                    "is_weekend": row[2],
-                    "total_trips": row[3],
-                    "avg_fare": row[4]
-                }
-                for row in result
-            ]
-        }
-    finally:
-        con.close()
+        """)
+        records = fetch_records(cursor, round_to={
+            "avg_fare": 2
+        })
+        return {"day_of_week_data": [
+            {"day_number": r["day_number"], "day_name": DAYS[r["day_number"]], **r}
+            for r in records
+        ]}
 
 @app.get("/api/temporal/heatmap")
-async def get_temporal_heatmap():
+def get_temporal_heatmap(format: ResponseFormat = "json"):
     """Get hour x day_of_week heatmap data"""
-    con = get_db_connection()
-    try:
-        result = con.execute("""
+    with acquire_conn() as con:
+        cursor = con.execute("""
             SELECT
-                pickup_day_of_week,
-                pickup_hour,
-                SUM(trip_count) as trip_count
+                pickup_day_of_week as day,
+                pickup_hour as hour,
+                SUM(trip_count)::BIGINT as trips
             FROM mv_hourly_demand
             GROUP BY pickup_day_of_week, pickup_hour
             ORDER BY pickup_day_of_week, pickup_hour
-        """).fetchall()
+        """)
+        if format == "arrow":
+            return arrow_response(cursor.fetch_arrow_table())
+        return {"heatmap_data": fetch_records(cursor)}
+
+@app.get("/api/temporal/all")
+def get_temporal_all():
+    """Get hourly, day-of-week and heatmap data in one call (single MV scan)"""
+    with acquire_conn() as con:
+        cursor = con.execute("""
+            SELECT
+                GROUPING(pickup_hour, pickup_day_of_week, is_weekend) as grouping_id,
+                pickup_hour as hour,
+                pickup_day_of_week as day,
+                is_weekend,
+                SUM(trip_count)::BIGINT as trips,
+                AVG(avg_fare) as avg_fare,
+                SUM(total_revenue) as total_revenue
+            FROM mv_hourly_demand
+            GROUP BY GROUPING SETS (
+                (pickup_hour),
+                (pickup_day_of_week, is_weekend),
+                (pickup_day_of_week, pickup_hour)
+            )
+            ORDER BY grouping_id, day, hour
+        """)
+        records = fetch_records(cursor, round_to={
+            "avg_fare": 2,
+            "total_revenue": 2
+        })
+
+    # grouping_id bits are (hour, day, is_weekend); a set bit means "not grouped by"
+    hourly_data, day_of_week_data, heatmap_data = [], [], []
+    for r in records:
+        if r["grouping_id"] == 0b011:
+            hourly_data.append({
+                "hour": r["hour"],
+                "total_trips": r["trips"],
+                "avg_fare": r["avg_fare"],
+                "total_revenue": r["total_revenue"]
+            })
+        elif r["grouping_id"] == 0b100:
+            day_of_week_data.append({
+                "day_number": r["day"],
+                "day_name": DAYS[r["day"]],
+                "is_weekend": r["is_weekend"],
+                "total_trips": r["trips"],
+                "avg_fare": r["avg_fare"]
+            })
+        else:
+            heatmap_data.append({"day": r["day"], "hour": r["hour"], "trips": r["trips"]})
 
-        return {
-            "heatmap_data": [
-                {
-                    "day": row[0],
-                    "hour": row[1],
-                    "trips": row[2]
-                }
-                for row in result
-            ]
-        }
-    finally:
-        con.close()
+    return {
+        "hourly_data": hourly_data,
+        "day_of_week_data": day_of_week_data,
+        "heatmap_data": heatmap_data
+    }
 
 # ============================================================
 # FEATURE 3: FARE STRUCTURE BREAKDOWN
 # ============================================================
 
 @app.get("/api/fare-structure/breakdown")
-async def get_fare_breakdown():
+@ttl_cache()
+def get_fare_breakdown():
     """Get average fare component breakdown"""
-    con = get_db_connection()
-    try:
+    with acquire_conn() as con:
         result = con.execute("""
             SELECT
-                COUNT(*) as total_trips,
-                ROUND(AVG(fare_amount), 2) as avg_base_fare,
-                ROUND(AVG(extra), 2) as avg_extra,
-                ROUND(AVG(mta_tax), 2) as avg_mta_tax,
-                ROUND(AVG(tip_amount), 2) as avg_tip,
-                ROUND(AVG(tolls_amount), 2) as avg_tolls,
-                ROUND(AVG(improvement_surcharge), 2) as avg_improvement_surcharge,
-                ROUND(AVG(congestion_surcharge), 2) as avg_congestion_surcharge,
-                ROUND(AVG(airport_fee), 2) as avg_airport_fee,
-                ROUND(AVG(total_amount), 2) as avg_total,
-                ROUND(AVG(tip_amount / NULLIF(total_amount, 0) * 100), 2) as tip_pct_of_total
-            FROM fact_trip
-            WHERE fare_amount > 0 AND fare_amount < 500
+                total_trips,
+                avg_base_fare,
+                avg_extra,
+                avg_mta_tax,
+                avg_tip,
+                avg_tolls,
+                avg_improvement_surcharge,
+                avg_congestion_surcharge,
+                avg_airport_fee,
+                avg_total,
+                tip_pct_of_total
+            FROM mv_fare_breakdown
         """).fetchone()
 
         return {
             "total_trips": result[0],
             "components": {
-                "base_fare": result[1],
-                "extra": result[2],
-                "mta_tax": result[3],
-                "tip": result[4],
-                "tolls": result[5],
-                "improvement_surcharge": result[6],
-                "congestion_surcharge": result[7],
-                "airport_fee": result[8],
-                "total": result[9]
+                "base_fare": round(result[1], 2),
+                "extra": round(result[2], 2),
+                "mta_tax": round(result[3], 2),
+                "tip": round(result[4], 2),
+                "tolls": round(result[5], 2),
+                "improvement_surcharge": round(result[6], 2),
+                "congestion_surcharge": round(result[7], 2),
+                "airport_fee": round(result[8], 2),
+                "total": round(result[9], 2)
             },
-            "tip_percentage_of_total": result[10]
+            "tip_percentage_of_total": round(result[10], 2)
         }
-    finally:
-        con.close()
 
 @app.get("/api/fare-structure/surcharges")
-async def get_surcharge_frequency():
+@ttl_cache()
+def get_surcharge_frequency():
     """Get frequency of different surcharges"""
-    con = get_db_connection()
-    try:
+    with acquire_conn() as con:
         result = con.execute("""
             SELECT
-                COUNT(*) as total_trips,
-                SUM(CASE WHEN congestion_surcharge > 0 THEN 1 ELSE 0 END) as trips_with_congestion,
-                SUM(CASE WHEN airport_fee > 0 THEN 1 ELSE 0 END) as trips_with_airport_fee,
-                SUM(CASE WHEN tolls_amount > 0 THEN 1 ELSE 0 END) as trips_with_tolls,
-                ROUND(SUM(CASE WHEN congestion_surcharge > 0 THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as congestion_pct,
-                ROUND(SUM(CASE WHEN airport_fee > 0 THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as airport_fee_pct,
-                ROUND(SUM(CASE WHEN tolls_amount > 0 THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as tolls_pct
-            FROM fact_trip
-            WHERE fare_amount > 0 AND fare_amount < 500
+                total_trips,
+                trips_with_congestion,
+                trips_with_airport_fee,
+                trips_with_tolls,
+                congestion_pct,
+                airport_fee_pct,
+                tolls_pct
+            FROM mv_surcharge_frequency
         """).fetchone()
 
         return {
@@ -352,314 +516,214 @@ async def get_surcharge_frequency():
                 "tolls": result[3]
             },
             "surcharge_percentages": {
-                "congestion": result[4],
-                "airport_fee": result[5],
-                "tolls": result[6]
+                "congestion": round(result[4], 2),
+                "airport_fee": round(result[5], 2),
+                "tolls": round(result[6], 2)
             }
         }
-    finally:
-        con.close()
 
 # ============================================================
 # FEATURE 4: AIRPORT TRIP ANALYSIS
 # ============================================================
 
 @app.get("/api/airport/comparison")
-async def get_airport_comparison():
+@ttl_cache()
+def get_airport_comparison():
     """Compare airport vs regular trips"""
-    con = get_db_connection()
-    try:
-        result = con.execute("""
+    with acquire_conn() as con:
+        cursor = con.execute("""
             SELECT
-                CASE
-                    WHEN rate_code_id = 2 THEN 'JFK Airport'
-                    WHEN rate_code_id = 3 THEN 'Newark Airport'
-                    WHEN airport_fee > 0 THEN 'Other Airport'
-                    ELSE 'Regular Trip'
-                END as trip_type,
-                COUNT(*) as trip_count,
-                ROUND(AVG(fare_amount), 2) as avg_fare,
-                ROUND(AVG(trip_distance), 2) as avg_distance,
-                ROUND(AVG(trip_duration_seconds / 60.0), 1) as avg_duration_min,
-                ROUND(AVG(tip_amount), 2) as avg_tip
-            FROM fact_trip
-            WHERE fare_amount > 0 AND fare_amount < 1000
-            GROUP BY trip_type
+                trip_type,
+                trip_count,
+                avg_fare,
+                avg_distance,
+                avg_duration_min,
+                avg_tip
+            FROM mv_airport_comparison
             ORDER BY trip_count DESC
-        """).fetchall()
-
-        return {
-            "comparison": [
-                {
-                    "trip_type": row[0],
-                    "trip_count": row[1],
-                    "avg_fare": row[2],
-                    "avg_distance": row[3],
-                    "avg_duration_min": row[4],
-                    "avg_tip": row[5]
-                }
-                for row in result
-            ]
-        }
-    finally:
-        con.close()
+        """)
+        records = fetch_records(cursor, round_to={
+            "avg_fare": 2,
+            "avg_distance": 2,
+            "avg_duration_min": 1,
+            "avg_tip": 2
+        })
+        return {"comparison": records}
+
+TOP_AIRPORT_ORIGINS_SQL = """
+    SELECT
+        l.zone,
+        COUNT(*) as trip_count,
+        AVG(t.fare_amount) as avg_fare,
+        AVG(t.trip_distance) as avg_distance
+    FROM fact_trip t
+    JOIN dim_location l ON t.pu_location_id = l.location_id
+    WHERE l.borough = 'Manhattan'
+      AND (t.rate_code_id IN (2, 3) OR t.airport_fee > 0)
+      AND t.fare_amount > 0
+    GROUP BY l.zone
+    HAVING COUNT(*) >= 10
+    ORDER BY trip_count DESC
+    LIMIT ?
+"""
 
 @app.get("/api/airport/top-origins")
-async def get_top_airport_origins(limit: int = 20):
+def get_top_airport_origins(limit: int = Query(20, ge=1, le=1000)):
     """Get top origin zones for airport trips"""
-    # Input validation - validates limit is safe integer
-    if not isinstance(limit, int) or not (1 <= limit <= 1000):
-        raise HTTPException(status_code=400, detail="Limit must be between 1 and 1000")
-
-    con = get_db_connection()
-    try:
-        # Note: LIMIT uses f-string since it's validated as safe integer (not user string input)
-        result = con.execute(f"""
-            SELECT
-                l.zone,
-                COUNT(*) as airport_trip_count,
-                ROUND(AVG(t.fare_amount), 2) as avg_fare,
-                ROUND(AVG(t.trip_distance), 2) as avg_distance
-            FROM fact_trip t
-            JOIN dim_location l ON t.pu_location_id = l.location_id
-            WHERE l.borough = 'Manhattan'
-              AND (t.rate_code_id IN (2, 3) OR t.airport_fee > 0)
-              AND t.fare_amount > 0
-            GROUP BY l.zone
-            HAVING COUNT(*) >= 10
-            ORDER BY airport_trip_count DESC
-            LIMIT {limit}
-        """).fetchall()
-
-        return {
-            "top_origins": [
-                {
-                    "zone": row[0],
-                    "trip_count": row[1],
-                    "avg_fare": row[2],
-                    "avg_distance": row[3]
-                }
-                for row in result
-            ]
-        }
-    finally:
-        con.close()
+    with acquire_conn() as con:
+        cursor = con.execute(TOP_AIRPORT_ORIGINS_SQL, [limit])
+        records = fetch_records(cursor, round_to={
+            "avg_fare": 2,
+            "avg_distance": 2
+        })
+        return {"top_origins": records}
 
 # ============================================================
 # FEATURE 5: ORIGIN-DESTINATION FLOW PATTERNS
 # ============================================================
 
-@app.get("/api/od-flows/top-routes")
-async def get_top_routes(limit: int = 50):
-    """Get top OD pairs by trip count"""
-    # Input validation - validates limit is safe integer
-    if not isinstance(limit, int) or not (1 <= limit <= 1000):
-        raise HTTPException(status_code=400, detail="Limit must be between 1 and 1000")
-
-    con = get_db_connection()
-    try:
-        # Note: LIMIT uses f-string since it's validated as safe integer (not user string input)
-        # Note: Changed alias from 'do' to 'dropoff' because 'do' is a reserved keyword in DuckDB
-        result = con.execute(f"""
-            SELECT
-                pu.zone as origin_zone,
-                dropoff.zone as destination_zone,
-                od.trip_count,
-                ROUND(od.avg_fare, 2) as avg_fare,
-                ROUND(od.avg_distance, 2) as avg_distance,
-                ROUND(od.avg_duration_sec / 60.0, 1) as avg_duration_min
-            FROM mv_od_flows od
-            JOIN dim_location pu ON od.pu_location_id = pu.location_id
-            JOIN dim_location dropoff ON od.do_location_id = dropoff.location_id
-            WHERE pu.borough = 'Manhattan' AND dropoff.borough = 'Manhattan'
-            ORDER BY od.trip_count DESC
-            LIMIT {limit}
-        """).fetchall()
+TOP_ROUTES_SQL = """
+    SELECT
+        pu_zone as origin,
+        do_zone as destination,
+        trip_count,
+        avg_fare,
+        avg_distance,
+        avg_duration_sec / 60.0 as avg_duration_min
+    FROM mv_od_flows
+    WHERE is_manhattan
+    ORDER BY trip_count DESC
+    LIMIT ?
+"""
 
-        return {
-            "top_routes": [
-                {
-                    "origin": row[0],
-                    "destination": row[1],
-                    "trip_count": row[2],
-                    "avg_fare": row[3],
-                    "avg_distance": row[4],
-                    "avg_duration_min": row[5]
-                }
-                for row in result
-            ]
-        }
-    finally:
-        con.close()
+@app.get("/api/od-flows/top-routes", response_model=RoutesResponse)
+def get_top_routes(limit: int = Query(50, ge=1, le=1000), format: ResponseFormat = "json"):
+    """Get top OD pairs by trip count"""
+    if format == "arrow":
+        return arrow_stream_response(TOP_ROUTES_SQL, [limit])
+
+    with acquire_conn() as con:
+        cursor = con.execute(TOP_ROUTES_SQL, [limit])
+        records = fetch_records(cursor, round_to={
+            "avg_fare": 2,
+            "avg_distance": 2,
+            "avg_duration_min": 1
+        })
+        return {"top_routes": records}
 
 # ============================================================
 # FEATURE 6: VENDOR MARKET SHARE & PERFORMANCE
 # ============================================================
 
 @app.get("/api/vendors/performance")
-async def get_vendor_performance():
+def get_vendor_performance():
     """Get vendor performance metrics"""
-    con = get_db_connection()
-    try:
-        result = con.execute("""
+    with acquire_conn() as con:
+        cursor = con.execute("""
             SELECT
                 v.vendor_name,
-                v.vendor_short_name,
+                v.vendor_short_name as vendor_short,
                 vp.trip_count,
-                ROUND(vp.trip_count * 100.0 / SUM(vp.trip_count) OVER (), 2) as market_share_pct,
-                ROUND(vp.avg_fare, 2) as avg_fare,
-                ROUND(vp.avg_tip, 2) as avg_tip,
-                ROUND(vp.avg_distance, 2) as avg_distance,
-                ROUND(vp.avg_duration_sec / 60.0, 1) as avg_duration_min
+                vp.trip_count * 100.0 / SUM(vp.trip_count) OVER () as market_share_pct,
+                vp.avg_fare,
+                vp.avg_tip,
+                vp.avg_distance,
+                vp.avg_duration_sec / 60.0 as avg_duration_min
             FROM mv_vendor_performance vp
             JOIN dim_vendor v ON vp.vendor_id = v.vendor_id
             ORDER BY vp.trip_count DESC
-        """).fetchall()
-
-        return {
-            "vendors": [
-                {
-                    "vendor_name": row[0],
-                    "vendor_short": row[1],
-                    "trip_count": row[2],
-                    "market_share_pct": row[3],
-                    "avg_fare": row[4],
-                    "avg_tip": row[5],
-                    "avg_distance": row[6],
-                    "avg_duration_min": row[7]
-                }
-                for row in result
-            ]
-        }
-    finally:
-        con.close()
+        """)
+        records = fetch_records(cursor, round_to={
+            "market_share_pct": 2,
+            "avg_fare": 2,
+            "avg_tip": 2,
+            "avg_distance": 2,
+            "avg_duration_min": 1
+        })
+        return {"vendors": records}
 
 # ============================================================
 # FEATURE 7: PAYMENT METHOD & TIPPING BEHAVIOR
 # ============================================================
 
 @app.get("/api/payment-tipping/by-payment-type")
-async def get_tipping_by_payment():
+@ttl_cache()
+def get_tipping_by_payment():
     """Get tipping behavior by payment type"""
-    con = get_db_connection()
-    try:
-        result = con.execute("""
+    with acquire_conn() as con:
+        cursor = con.execute("""
             SELECT
-                pt.payment_type_name,
-                pt.is_card_payment,
-                pt.allows_tip,
-                COUNT(*) as trip_count,
-                ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (), 2) as pct_of_trips,
-                ROUND(AVG(t.tip_amount), 2) as avg_tip,
-                ROUND(AVG(t.fare_amount), 2) as avg_fare,
-                ROUND(AVG(CASE WHEN t.fare_amount > 0 THEN (t.tip_amount / t.fare_amount) * 100 ELSE NULL END), 2) as avg_tip_pct,
-                ROUND(SUM(CASE WHEN t.tip_amount > 0 THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as tipping_frequency_pct
-            FROM fact_trip t
-            JOIN dim_payment_type pt ON t.payment_type_id = pt.payment_type_id
-            WHERE t.fare_amount > 0 AND t.fare_amount < 500
-            GROUP BY pt.payment_type_name, pt.is_card_payment, pt.allows_tip
+                payment_type_name as payment_type,
+                is_card_payment as is_card,
+                allows_tip,
+                trip_count,
+                pct_of_trips,
+                avg_tip,
+                avg_fare,
+                avg_tip_pct,
+                tipping_frequency_pct
+            FROM mv_payment_tipping
             ORDER BY trip_count DESC
-        """).fetchall()
-
-        return {
-            "payment_types": [
-                {
-                    "payment_type": row[0],
-                    "is_card": row[1],
-                    "allows_tip": row[2],
-                    "trip_count": row[3],
-                    "pct_of_trips": row[4],
-                    "avg_tip": row[5],
-                    "avg_fare": row[6],
-                    "avg_tip_pct": row[7],
-                    "tipping_frequency_pct": row[8]
-                }
-                for row in result
-            ]
-        }
-    finally:
-        con.close()
+        """)
+        records = fetch_records(cursor, round_to={
+            "pct_of_trips": 2,
+            "avg_tip": 2,
+            "avg_fare": 2,
+            "avg_tip_pct": 2,
+            "tipping_frequency_pct": 2
+        })
+        return {"payment_types": records}
 
 # ============================================================
 # FEATURE 8: OUTLIER & ANOMALY DETECTION
 # ============================================================
 
-@app.get("/api/anomalies/high-fare-per-mile")
-async def get_high_fare_per_mile(limit: int = 100):
-    """Get trips with unusually high fare per mile"""
-    # Input validation - validates limit is safe integer
-    if not isinstance(limit, int) or not (1 <= limit <= 1000):
-        raise HTTPException(status_code=400, detail="Limit must be between 1 and 1000")
-
-    con = get_db_connection()
-    try:
-        # Note: LIMIT uses f-string since it's validated as safe integer (not user string input)
-        # Note: Changed alias from 'do' to 'dropoff' because 'do' is a reserved keyword in DuckDB
-        result = con.execute(f"""
-            SELECT
-                t.trip_id,
-                t.pickup_datetime,
-                pu.zone as pickup_zone,
-                dropoff.zone as dropoff_zone,
-                ROUND(t.fare_amount, 2) as fare_amount,
-                ROUND(t.trip_distance, 2) as trip_distance,
-                ROUND(t.fare_amount / NULLIF(t.trip_distance, 0), 2) as fare_per_mile,
-                ROUND(t.trip_duration_seconds / 60.0, 1) as duration_min
-            FROM fact_trip t
-            JOIN dim_location pu ON t.pu_location_id = pu.location_id
-            JOIN dim_location dropoff ON t.do_location_id = dropoff.location_id
-            WHERE t.trip_distance > 0
-              AND t.trip_distance < 100
-              AND t.fare_amount / t.trip_distance > 50
-              AND t.fare_amount < 1000
-            ORDER BY fare_per_mile DESC
-            LIMIT {limit}
-        """).fetchall()
+HIGH_FARE_PER_MILE_SQL = """
+    SELECT
+        trip_id,
+        pickup_datetime,
+        pickup_zone,
+        dropoff_zone,
+        fare_amount,
+        trip_distance,
+        fare_per_mile,
+        trip_duration_seconds / 60.0 as duration_min
+    FROM mv_high_fare_trips
+    ORDER BY fare_per_mile DESC
+    LIMIT ?
+"""
 
-        return {
-            "anomalies": [
-                {
-                    "trip_id": row[0],
-                    "pickup_datetime": str(row[1]),
-                    "pickup_zone": row[2],
-                    "dropoff_zone": row[3],
-                    "fare_amount": row[4],
-                    "trip_distance": row[5],
-                    "fare_per_mile": row[6],
-                    "duration_min": row[7]
-                }
-                for row in result
-            ]
-        }
-    finally:
-        con.close()
+@app.get("/api/anomalies/high-fare-per-mile", response_model=HighFareAnomaliesResponse)
+def get_high_fare_per_mile(limit: int = Query(100, ge=1, le=1000), format: ResponseFormat = "json"):
+    """Get trips with unusually high fare per mile"""
+    if format == "arrow":
+        return arrow_stream_response(HIGH_FARE_PER_MILE_SQL, [limit])
+
+    with acquire_conn() as con:
+        cursor = con.execute(HIGH_FARE_PER_MILE_SQL, [limit])
+        anomalies = fetch_records(cursor, round_to={
+            "fare_amount": 2,
+            "trip_distance": 2,
+            "fare_per_mile": 2,
+            "duration_min": 1
+        })
+        for anomaly in anomalies:
+            anomaly["pickup_datetime"] = str(anomaly["pickup_datetime"])
+
+        return {"anomalies": anomalies}
 
 @app.get("/api/anomalies/summary")
-async def get_anomaly_summary():
+@ttl_cache()
+def get_anomaly_summary():
     """Get summary statistics of different anomaly types"""
-    con = get_db_connection()
-    try:
-        # High fare per mile
-        high_fare = con.execute("""
-            SELECT COUNT(*)
-            FROM fact_trip
-            WHERE trip_distance > 0
-              AND fare_amount / trip_distance > 50
-              AND fare_amount < 1000
-        """).fetchone()[0]
-
-        # No tip on expensive trips
-        no_tip = con.execute("""
-            SELECT COUNT(*)
-            FROM fact_trip t
-            JOIN dim_payment_type pt ON t.payment_type_id = pt.payment_type_id
-            WHERE t.fare_amount > 50
-              AND t.tip_amount = 0
-              AND pt.allows_tip = TRUE
-        """).fetchone()[0]
-
-        # Total trips
-        total = con.execute("SELECT COUNT(*) FROM fact_trip").fetchone()[0]
+    with acquire_conn() as con:
+        total, high_fare, no_tip = con.execute("""
+            SELECT
+                total_trips,
+                high_fare_per_mile_count,
+                no_tip_expensive_count
+            FROM mv_anomaly_summary
+        """).fetchone()
 
         return {
             "total_trips": total,
@@ -674,8 +738,6 @@ async def get_anomaly_summary():
                 }
             }
         }
-    finally:
-        con.close()
 
 if __name__ == "__main__":
     import uvicorn
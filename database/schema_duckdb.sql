@@ -10,6 +10,7 @@ DROP TABLE IF EXISTS dim_location;
 DROP TABLE IF EXISTS dim_vendor;
 DROP TABLE IF EXISTS dim_payment_type;
 DROP TABLE IF EXISTS dim_rate_code;
+DROP SEQUENCE IF EXISTS trip_seq;
 
 -- ============================================================
 -- DIMENSION TABLES
@@ -46,9 +47,12 @@ CREATE TABLE dim_rate_code (
 -- FACT TABLE
 -- ============================================================
 
+-- Surrogate trip_id source for the bulk load (parallel-safe, unlike ROW_NUMBER())
+CREATE SEQUENCE trip_seq START 1;
+
 CREATE TABLE fact_trip (
-    -- Primary key
-    trip_id BIGINT PRIMARY KEY,
+    -- Primary key (added after the bulk load)
+    trip_id BIGINT NOT NULL,
 
     -- Foreign keys to dimensions
     vendor_id INTEGER NOT NULL,
@@ -89,23 +93,7 @@ CREATE TABLE fact_trip (
 -- ============================================================
 -- INDEXES FOR QUERY OPTIMIZATION
 -- ============================================================
-
--- Temporal indexes
-CREATE INDEX idx_pickup_datetime ON fact_trip(pickup_datetime);
-CREATE INDEX idx_pickup_date ON fact_trip(pickup_date);
-CREATE INDEX idx_pickup_hour ON fact_trip(pickup_hour);
-
--- Spatial indexes
-CREATE INDEX idx_pu_location ON fact_trip(pu_location_id);
-CREATE INDEX idx_do_location ON fact_trip(do_location_id);
-
--- Composite index for OD pair analysis
-CREATE INDEX idx_od_pair ON fact_trip(pu_location_id, do_location_id);
-
--- Dimensional indexes
-CREATE INDEX idx_vendor ON fact_trip(vendor_id);
-CREATE INDEX idx_payment_type ON fact_trip(payment_type_id);
-CREATE INDEX idx_rate_code ON fact_trip(rate_code_id);
-
--- Composite for temporal-spatial queries
-CREATE INDEX idx_zone_temporal ON fact_trip(pu_location_id, pickup_date);
+-- The trip_id primary key and fact_trip indexes are created by
+-- etl_pipeline.py (create_indexes) after the bulk load, so the load does
+-- not maintain them row by row. Range scans on pickup_datetime and
+-- low-cardinality columns are served by DuckDB's min/max zonemaps.
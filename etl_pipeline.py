@@ -13,12 +13,18 @@ Features:
 """
 
 import duckdb
-import pandas as pd
+import pyarrow as pa
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime
+from functools import lru_cache
+import hashlib
+import logging
+import re
 import time
 import sys
 
+logger = logging.getLogger(__name__)
+
 # Configuration - use relative paths for portability
 PROJECT_ROOT = Path(__file__).parent
 DATA_DIR = PROJECT_ROOT / "data" / "raw"
@@ -29,13 +35,56 @@ ZONE_LOOKUP_PATH = DATA_DIR / "taxi_zone_lookup.csv"
 BATCH_SIZE = 1_000_000  # Process 1M rows at a time
 USE_PARALLEL = True
 MEMORY_LIMIT = '8GB'
+CHECKPOINT_THRESHOLD = '1GB'
+
+# Static dimension rows
+DIM_VENDOR_ROWS = [
+    {"vendor_id": 1, "vendor_name": "Creative Mobile Technologies", "vendor_short_name": "CMT"},
+    {"vendor_id": 2, "vendor_name": "VeriFone Inc.", "vendor_short_name": "VTS"},
+    {"vendor_id": 6, "vendor_name": "Other", "vendor_short_name": "Other"},
+    {"vendor_id": 7, "vendor_name": "Other", "vendor_short_name": "Other"},
+]
+
+DIM_PAYMENT_TYPE_ROWS = [
+    {"payment_type_id": 0, "payment_type_name": "Unknown", "is_card_payment": False, "allows_tip": False},
+    {"payment_type_id": 1, "payment_type_name": "Credit card", "is_card_payment": True, "allows_tip": True},
+    {"payment_type_id": 2, "payment_type_name": "Cash", "is_card_payment": False, "allows_tip": False},
+    {"payment_type_id": 3, "payment_type_name": "No charge", "is_card_payment": False, "allows_tip": False},
+    {"payment_type_id": 4, "payment_type_name": "Dispute", "is_card_payment": False, "allows_tip": False},
+    {"payment_type_id": 5, "payment_type_name": "Unknown", "is_card_payment": False, "allows_tip": False},
+]
+
+DIM_RATE_CODE_ROWS = [
+    {"rate_code_id": 1, "rate_code_name": "Standard rate", "is_airport": False, "is_standard": True},
+    {"rate_code_id": 2, "rate_code_name": "JFK", "is_airport": True, "is_standard": False},
+    {"rate_code_id": 3, "rate_code_name": "Newark", "is_airport": True, "is_standard": False},
+    {"rate_code_id": 4, "rate_code_name": "Nassau or Westchester", "is_airport": False, "is_standard": False},
+    {"rate_code_id": 5, "rate_code_name": "Negotiated fare", "is_airport": False, "is_standard": False},
+    {"rate_code_id": 6, "rate_code_name": "Group ride", "is_airport": False, "is_standard": False},
+    {"rate_code_id": 99, "rate_code_name": "Other", "is_airport": False, "is_standard": False},
+]
+
+@lru_cache(maxsize=None)
+def _load_schema_statements(schema_path):
+    """Read a SQL file into a list of statements, with -- comments stripped"""
+    schema_sql = re.sub(r'--[^\n]*', '', Path(schema_path).read_text())
+    return [stmt.strip() for stmt in schema_sql.split(';') if stmt.strip()]
+
+def _input_files_digest(paths):
+    """Digest the sorted (name, size, mtime_ns) of the input files, so a phase
+    can tell when files were added, replaced or removed since it ran"""
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        stat = path.stat()
+        digest.update(f"{path.name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
 
 class TaxiETLPipeline:
     """ETL Pipeline for NYC Taxi Data"""
 
     def __init__(self, db_path):
         """Initialize database connection"""
-        print(f"[{self._timestamp()}] Initializing ETL Pipeline...")
+        logger.info("Initializing ETL Pipeline...")
 
         # Create database connection with optimizations
         self.con = duckdb.connect(str(db_path))
@@ -44,50 +93,99 @@ class TaxiETLPipeline:
         self.con.execute(f"SET memory_limit='{MEMORY_LIMIT}'")
         self.con.execute("SET threads=8")  # Use 8 threads
         self.con.execute("SET preserve_insertion_order=false")  # Faster inserts
+        self.con.execute(f"SET checkpoint_threshold='{CHECKPOINT_THRESHOLD}'")  # No WAL flushes mid-load
+        self.con.execute("SET enable_object_cache=true")  # Cache Parquet metadata across scans
+
+        # Completed phases, so a re-run (or a resume after a crash) skips them
+        self.con.execute("""
+            CREATE TABLE IF NOT EXISTS etl_state (
+                phase VARCHAR PRIMARY KEY,
+                rowcount BIGINT,
+                completed_at TIMESTAMP
+            )
+        """)
+        # Digest of the input files a phase ran against (added after etl_state
+        # was first released, so older databases get the column here)
+        self.con.execute("ALTER TABLE etl_state ADD COLUMN IF NOT EXISTS input_digest VARCHAR")
+
+        logger.info(f"Database initialized at: {db_path}")
+        logger.info(f"Configuration: {MEMORY_LIMIT} memory, 8 threads")
 
-        print(f"[{self._timestamp()}] Database initialized at: {db_path}")
-        print(f"[{self._timestamp()}] Configuration: {MEMORY_LIMIT} memory, 8 threads")
+    def _fact_trip_rowcount(self):
+        """Get the number of rows currently in fact_trip"""
+        return self.con.execute("SELECT COUNT(*) FROM fact_trip").fetchone()[0]
 
-    def _timestamp(self):
-        """Get current timestamp string"""
-        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def _fact_trip_has_key(self):
+        """Check whether fact_trip already has its primary key (or the unique
+        index that stands in for it)"""
+        return self.con.execute("""
+            SELECT
+                EXISTS (
+                    SELECT 1 FROM duckdb_constraints()
+                    WHERE table_name = 'fact_trip' AND constraint_type = 'PRIMARY KEY'
+                )
+                OR EXISTS (
+                    SELECT 1 FROM duckdb_indexes()
+                    WHERE table_name = 'fact_trip' AND index_name = 'idx_trip_id'
+                )
+        """).fetchone()[0]
+
+    def _phase_complete(self, phase, rowcount=None, input_digest=None):
+        """Check whether a phase already ran; if rowcount or input_digest is
+        given, it must also match the value recorded when the phase completed"""
+        row = self.con.execute(
+            "SELECT rowcount, input_digest FROM etl_state WHERE phase = ?", [phase]
+        ).fetchone()
+        if row is None:
+            return False
+        if rowcount is not None and row[0] != rowcount:
+            return False
+        if input_digest is not None and row[1] != input_digest:
+            return False
+        logger.info(f"Skipping {phase}: already completed")
+        return True
+
+    def _mark_phase_complete(self, phase, rowcount, input_digest=None):
+        """Record a completed phase and the fact_trip rowcount (and input files)
+        it ran against"""
+        self.con.execute("""
+            INSERT OR REPLACE INTO etl_state (phase, rowcount, completed_at, input_digest)
+            VALUES (?, ?, now(), ?)
+        """, [phase, rowcount, input_digest])
 
     def create_schema(self):
         """Create database schema with DuckDB-compatible structure"""
-        print(f"\n[{self._timestamp()}] Creating database schema...")
+        if self._phase_complete('create_schema'):
+            return
+
+        logger.info("Creating database schema...")
 
         # Read and execute the DuckDB-compatible schema
         schema_path = Path(__file__).parent / "database" / "schema_duckdb.sql"
 
         if schema_path.exists():
-            print(f"[{self._timestamp()}] Loading schema from: {schema_path}")
-            with open(schema_path, 'r') as f:
-                schema_sql = f.read()
-
-            # Execute schema - split by semicolon and filter comments
-            statements = []
-            for stmt in schema_sql.split(';'):
-                stmt = stmt.strip()
-                # Remove SQL comments
-                lines = [line for line in stmt.split('\n') if not line.strip().startswith('--')]
-                clean_stmt = '\n'.join(lines).strip()
-                if clean_stmt:
-                    statements.append(clean_stmt)
-
-            print(f"[{self._timestamp()}] Executing {len(statements)} SQL statements...")
+            logger.info(f"Loading schema from: {schema_path}")
+            statements = _load_schema_statements(schema_path)
+
+            # All DDL in one transaction
+            logger.info(f"Executing {len(statements)} SQL statements...")
+            self.con.execute("BEGIN TRANSACTION")
             for i, stmt in enumerate(statements):
                 try:
                     self.con.execute(stmt)
-                    if (i + 1) % 5 == 0:
-                        print(f"[{self._timestamp()}] Progress: {i+1}/{len(statements)} statements")
                 except Exception as e:
-                    print(f"[{self._timestamp()}] Error in statement {i+1}: {str(e)[:150]}")
+                    self.con.execute("ROLLBACK")
+                    logger.error(f"Error in statement {i+1}: {str(e)[:150]}")
                     raise
+            self.con.execute("COMMIT")
         else:
-            print(f"[{self._timestamp()}] Schema file not found, creating basic schema...")
+            logger.info("Schema file not found, creating basic schema...")
             self._create_basic_schema()
 
-        print(f"[{self._timestamp()}] Schema created successfully")
+        # A fresh schema has no data, so every later phase has to run again
+        self.con.execute("DELETE FROM etl_state")
+        self._mark_phase_complete('create_schema', 0)
+        logger.info("Schema created successfully")
 
     def _create_basic_schema(self):
         """Create basic schema if optimized version not available"""
@@ -128,9 +226,10 @@ class TaxiETLPipeline:
         """)
 
         # Fact table
+        self.con.execute("CREATE SEQUENCE IF NOT EXISTS trip_seq START 1")
         self.con.execute("""
             CREATE TABLE IF NOT EXISTS fact_trip (
-                trip_id BIGINT PRIMARY KEY,
+                trip_id BIGINT,
                 vendor_id INTEGER,
                 pu_location_id INTEGER,
                 do_location_id INTEGER,
@@ -161,361 +260,644 @@ class TaxiETLPipeline:
 
     def load_dimensions(self):
         """Load dimension tables"""
-        print(f"\n[{self._timestamp()}] Loading dimension tables...")
-
-        # Load location dimension from CSV
-        print(f"[{self._timestamp()}] Loading taxi zones...")
-        zones_df = pd.read_csv(ZONE_LOOKUP_PATH)
-
-        # Rename columns to match schema (lowercase)
-        zones_df.columns = [col.lower() for col in zones_df.columns]
+        if self._phase_complete('load_dimensions'):
+            return
 
-        # Rename to match schema exactly
-        zones_df = zones_df.rename(columns={
-            'locationid': 'location_id'
-        })
+        logger.info("Loading dimension tables...")
 
-        # Drop rows with null values in required columns
-        initial_count = len(zones_df)
-        zones_df = zones_df.dropna(subset=['location_id', 'borough', 'zone'])
-        filtered_count = initial_count - len(zones_df)
+        # Load location dimension from CSV
+        logger.info("Loading taxi zones...")
+        # Parsed, renamed and cleaned inside DuckDB. The lookup marks missing
+        # values as 'N/A': rows missing a required field are dropped and a
+        # missing service_zone becomes 'Unknown'
+        zones_csv = str(ZONE_LOOKUP_PATH)
+        initial_count = self.con.execute(
+            "SELECT COUNT(*) FROM read_csv_auto(?)", [zones_csv]
+        ).fetchone()[0]
+        loaded_count = self.con.execute("""
+            INSERT INTO dim_location
+            SELECT * FROM (
+                SELECT
+                    LocationID as location_id,
+                    NULLIF(Borough, 'N/A') as borough,
+                    NULLIF(Zone, 'N/A') as zone,
+                    COALESCE(NULLIF(service_zone, 'N/A'), 'Unknown') as service_zone
+                FROM read_csv_auto(?)
+            )
+            WHERE location_id IS NOT NULL
+              AND borough IS NOT NULL
+              AND zone IS NOT NULL
+        """, [zones_csv]).fetchone()[0]
+        filtered_count = initial_count - loaded_count
         if filtered_count > 0:
-            print(f"[{self._timestamp()}] Filtered {filtered_count} zones with null values")
-
-        # Fill null service_zone with 'Unknown'
-        zones_df['service_zone'] = zones_df['service_zone'].fillna('Unknown')
-
-        # Insert into dim_location
-        self.con.execute("INSERT INTO dim_location SELECT * FROM zones_df")
+            logger.info(f"Filtered {filtered_count} zones with null values")
 
         zone_count = self.con.execute("SELECT COUNT(*) FROM dim_location").fetchone()[0]
         manhattan_count = self.con.execute(
             "SELECT COUNT(*) FROM dim_location WHERE borough = 'Manhattan'"
         ).fetchone()[0]
 
-        print(f"[{self._timestamp()}] Loaded {zone_count} zones ({manhattan_count} Manhattan)")
-
-        # Load vendor dimension
-        print(f"[{self._timestamp()}] Loading vendors...")
-        self.con.execute("""
-            INSERT INTO dim_vendor VALUES
-                (1, 'Creative Mobile Technologies', 'CMT'),
-                (2, 'VeriFone Inc.', 'VTS'),
-                (6, 'Other', 'Other'),
-                (7, 'Other', 'Other')
-        """)
-        print(f"[{self._timestamp()}] Loaded vendors")
+        logger.info(f"Loaded {zone_count} zones ({manhattan_count} Manhattan)")
 
-        # Load payment type dimension
-        print(f"[{self._timestamp()}] Loading payment types...")
-        self.con.execute("""
-            INSERT INTO dim_payment_type VALUES
-                (0, 'Unknown', FALSE, FALSE),
-                (1, 'Credit card', TRUE, TRUE),
-                (2, 'Cash', FALSE, FALSE),
-                (3, 'No charge', FALSE, FALSE),
-                (4, 'Dispute', FALSE, FALSE),
-                (5, 'Unknown', FALSE, FALSE)
-        """)
-        print(f"[{self._timestamp()}] Loaded payment types")
+        # Static dimensions go in through Arrow, which DuckDB scans zero-copy
+        logger.info("Loading vendors...")
+        self._insert_rows("dim_vendor", DIM_VENDOR_ROWS)
+        logger.info("Loaded vendors")
 
-        # Load rate code dimension
-        print(f"[{self._timestamp()}] Loading rate codes...")
-        self.con.execute("""
-            INSERT INTO dim_rate_code VALUES
-                (1, 'Standard rate', FALSE, TRUE),
-                (2, 'JFK', TRUE, FALSE),
-                (3, 'Newark', TRUE, FALSE),
-                (4, 'Nassau or Westchester', FALSE, FALSE),
-                (5, 'Negotiated fare', FALSE, FALSE),
-                (6, 'Group ride', FALSE, FALSE),
-                (99, 'Other', FALSE, FALSE)
-        """)
-        print(f"[{self._timestamp()}] Loaded rate codes")
+        logger.info("Loading payment types...")
+        self._insert_rows("dim_payment_type", DIM_PAYMENT_TYPE_ROWS)
+        logger.info("Loaded payment types")
 
-    def load_trip_data(self):
-        """Load trip data from Parquet files with filtering and transformation"""
-        print(f"\n[{self._timestamp()}] Loading trip data...")
+        logger.info("Loading rate codes...")
+        self._insert_rows("dim_rate_code", DIM_RATE_CODE_ROWS)
+        logger.info("Loaded rate codes")
 
-        # Get Manhattan zone IDs
-        manhattan_zones = self.con.execute("""
-            SELECT location_id FROM dim_location WHERE borough = 'Manhattan'
-        """).fetchall()
-        manhattan_zone_ids = [z[0] for z in manhattan_zones]
+        self._mark_phase_complete('load_dimensions', 0)
 
-        print(f"[{self._timestamp()}] Manhattan zones: {len(manhattan_zone_ids)} IDs")
+    def _insert_rows(self, table_name, rows):
+        """Bulk-insert a list of row dicts into a table via an Arrow table"""
+        self.con.from_arrow(pa.Table.from_pylist(rows)).insert_into(table_name)
 
+    def load_trip_data(self):
+        """Load trip data from Parquet files with filtering and transformation"""
         # Find all parquet files
         parquet_files = sorted(DATA_DIR.glob("yellow_tripdata_2025-*.parquet"))
 
+        # Later phases are gated on fact_trip's rowcount, so a failed load
+        # stops the run instead of building empty materialized views
         if not parquet_files:
-            print(f"[{self._timestamp()}] ERROR: No parquet files found in {DATA_DIR}")
+            raise FileNotFoundError(f"No parquet files found in {DATA_DIR}")
+
+        # Gated on the input files, so adding or replacing one reloads fact_trip
+        input_digest = _input_files_digest(parquet_files)
+        if self._phase_complete('load_trip_data', input_digest=input_digest):
             return
 
-        print(f"[{self._timestamp()}] Found {len(parquet_files)} parquet files")
+        logger.info("Loading trip data...")
+        logger.info(f"Found {len(parquet_files)} parquet files")
 
-        total_trips_loaded = 0
-        total_trips_filtered = 0
+        files = [str(f) for f in parquet_files]
 
-        # Process each file
-        for i, parquet_file in enumerate(parquet_files, 1):
-            print(f"\n[{self._timestamp()}] Processing file {i}/{len(parquet_files)}: {parquet_file.name}")
+        # Original per-file row counts, taken once up front for the filter report
+        file_counts = self.con.execute("""
+            SELECT filename, COUNT(*)
+            FROM read_parquet(?, union_by_name=true, filename=true)
+            GROUP BY filename
+            ORDER BY filename
+        """, [files]).fetchall()
+        for filename, count in file_counts:
+            logger.info(f"{Path(filename).name}: {count:,} trips")
+        original_count = sum(count for _, count in file_counts)
 
-            start_time = time.time()
+        logger.info(f"Loading {original_count:,} trips from all files in one scan...")
+        start_time = time.time()
 
-            try:
-                # Load and filter data in one query (most efficient in DuckDB)
-                insert_query = f"""
-                    INSERT INTO fact_trip
+        in_transaction = False
+        try:
+            # Load and filter all files in one query so DuckDB can parallelize
+            # across files; trip_ids come from a sequence, which (unlike an
+            # unpartitioned ROW_NUMBER()) does not serialize the pipeline
+            insert_query = """
+                INSERT INTO fact_trip
+                WITH raw_trips AS (
+                    -- Only the columns fact_trip needs, with the cheap numeric
+                    -- filters next to the scan so Parquet row-group statistics apply
                     SELECT
-                        -- Generate unique trip_id
-                        ROW_NUMBER() OVER () + {total_trips_loaded} as trip_id,
-
-                        -- Foreign keys
-                        VendorID as vendor_id,
-                        PULocationID as pu_location_id,
-                        DOLocationID as do_location_id,
-                        payment_type as payment_type_id,
-                        RatecodeID as rate_code_id,
-
-                        -- Temporal attributes
-                        tpep_pickup_datetime as pickup_datetime,
-                        tpep_dropoff_datetime as dropoff_datetime,
+                        VendorID,
+                        PULocationID,
+                        DOLocationID,
+                        payment_type,
+                        RatecodeID,
+                        tpep_pickup_datetime,
+                        tpep_dropoff_datetime,
+                        passenger_count,
+                        trip_distance,
+                        fare_amount,
+                        extra,
+                        mta_tax,
+                        tip_amount,
+                        tolls_amount,
+                        improvement_surcharge,
+                        total_amount,
+                        congestion_surcharge,
+                        airport_fee,
+                        store_and_fwd_flag,
+                        -- Timestamp parts are derived once here and reused below
                         CAST(tpep_pickup_datetime AS DATE) as pickup_date,
-                        CAST(EXTRACT(HOUR FROM tpep_pickup_datetime) AS TINYINT) as pickup_hour,
+                        CAST(hour(tpep_pickup_datetime) AS TINYINT) as pickup_hour,
                         CAST(EXTRACT(DOW FROM tpep_pickup_datetime) AS TINYINT) as pickup_day_of_week,
-                        CASE WHEN EXTRACT(DOW FROM tpep_pickup_datetime) IN (0, 6) THEN TRUE ELSE FALSE END as is_weekend,
-
-                        -- Trip characteristics
-                        CAST(passenger_count AS TINYINT) as passenger_count,
-                        CAST(trip_distance AS FLOAT) as trip_distance,
-                        CAST(EXTRACT(EPOCH FROM (tpep_dropoff_datetime - tpep_pickup_datetime)) AS INTEGER) as trip_duration_seconds,
-
-                        -- Fare breakdown
-                        CAST(fare_amount AS FLOAT) as fare_amount,
-                        CAST(extra AS FLOAT) as extra,
-                        CAST(mta_tax AS FLOAT) as mta_tax,
-                        CAST(tip_amount AS FLOAT) as tip_amount,
-                        CAST(tolls_amount AS FLOAT) as tolls_amount,
-                        CAST(improvement_surcharge AS FLOAT) as improvement_surcharge,
-                        CAST(total_amount AS FLOAT) as total_amount,
-                        CAST(congestion_surcharge AS FLOAT) as congestion_surcharge,
-                        CAST(airport_fee AS FLOAT) as airport_fee,
-                        CAST(0 AS FLOAT) as cbd_congestion_fee,  -- Add if available in data
-
-                        -- Flags
-                        store_and_fwd_flag
-
-                    FROM read_parquet('{parquet_file}')
+                        EXTRACT(EPOCH FROM (tpep_dropoff_datetime - tpep_pickup_datetime)) as duration_seconds
+                    FROM read_parquet(?, union_by_name=true)
                     WHERE
-                        -- Manhattan-only trips (both pickup and dropoff)
-                        PULocationID IN ({','.join(map(str, manhattan_zone_ids))})
-                        AND DOLocationID IN ({','.join(map(str, manhattan_zone_ids))})
-
                         -- Data quality filters
-                        AND fare_amount > 0
+                        fare_amount > 0
                         AND fare_amount < 500
                         AND trip_distance > 0
                         AND trip_distance < 200
                         AND passenger_count BETWEEN 1 AND 6
-                        AND tpep_pickup_datetime < tpep_dropoff_datetime
-                        AND EXTRACT(EPOCH FROM (tpep_dropoff_datetime - tpep_pickup_datetime)) < 7200
-                """
 
-                # Execute insert
-                self.con.execute(insert_query)
+                        -- Manhattan-only trips (both pickup and dropoff), as hash semi-joins
+                        AND PULocationID IN (SELECT location_id FROM dim_location WHERE borough = 'Manhattan')
+                        AND DOLocationID IN (SELECT location_id FROM dim_location WHERE borough = 'Manhattan')
+                )
+                SELECT
+                    -- Generate unique trip_id
+                    nextval('trip_seq') as trip_id,
+
+                    -- Foreign keys
+                    VendorID as vendor_id,
+                    PULocationID as pu_location_id,
+                    DOLocationID as do_location_id,
+                    payment_type as payment_type_id,
+                    RatecodeID as rate_code_id,
+
+                    -- Temporal attributes
+                    tpep_pickup_datetime as pickup_datetime,
+                    tpep_dropoff_datetime as dropoff_datetime,
+                    pickup_date,
+                    pickup_hour,
+                    pickup_day_of_week,
+                    pickup_day_of_week IN (0, 6) as is_weekend,
+
+                    -- Trip characteristics
+                    CAST(passenger_count AS TINYINT) as passenger_count,
+                    CAST(trip_distance AS FLOAT) as trip_distance,
+                    CAST(duration_seconds AS INTEGER) as trip_duration_seconds,
+
+                    -- Fare breakdown
+                    CAST(fare_amount AS FLOAT) as fare_amount,
+                    CAST(extra AS FLOAT) as extra,
+                    CAST(mta_tax AS FLOAT) as mta_tax,
+                    CAST(tip_amount AS FLOAT) as tip_amount,
+                    CAST(tolls_amount AS FLOAT) as tolls_amount,
+                    CAST(improvement_surcharge AS FLOAT) as improvement_surcharge,
+                    CAST(total_amount AS FLOAT) as total_amount,
+                    CAST(congestion_surcharge AS FLOAT) as congestion_surcharge,
+                    CAST(airport_fee AS FLOAT) as airport_fee,
+                    CAST(0 AS FLOAT) as cbd_congestion_fee,  -- Add if available in data
+
+                    -- Flags
+                    store_and_fwd_flag
+
+                FROM raw_trips
+                WHERE tpep_pickup_datetime < tpep_dropoff_datetime
+                  AND duration_seconds < 7200
+                -- Stored in pickup order so row-group zonemaps on pickup_datetime /
+                -- pickup_date are tight and time-range scans can skip row groups
+                ORDER BY tpep_pickup_datetime
+            """
+
+            # One transaction for the whole load, then a single checkpoint so the
+            # compressors see complete row groups instead of WAL-flushed fragments
+            self.con.execute("BEGIN TRANSACTION")
+            in_transaction = True
+            # A reload replaces the trips of the previous input files, so every
+            # phase built on them has to run again
+            self.con.execute("DELETE FROM fact_trip")
+            self.con.execute("DELETE FROM etl_state WHERE phase NOT IN ('create_schema', 'load_dimensions')")
+            # INSERT returns the number of rows it inserted
+            total_trips_loaded = self.con.execute(insert_query, [files]).fetchone()[0]
+            self.con.execute("COMMIT")
+            in_transaction = False
+        except Exception as e:
+            if in_transaction:
+                self.con.execute("ROLLBACK")
+            logger.error(f"Failed to load trip data: {str(e)}")
+            raise
+
+        self.con.execute("CHECKPOINT")
+
+        elapsed = time.time() - start_time
+        total_trips_filtered = original_count - total_trips_loaded
+        rate = total_trips_loaded / elapsed if elapsed > 0 else 0
+        filter_rate = total_trips_filtered * 100 / original_count if original_count > 0 else 0
+
+        # Per-pickup-month breakdown; the TLC files carry a few out-of-month
+        # pickups, so these counts don't line up exactly with the files above
+        monthly_counts = self.con.execute("""
+            SELECT strftime(pickup_date, '%Y-%m') as month, COUNT(*)
+            FROM fact_trip
+            GROUP BY month
+            ORDER BY month
+        """).fetchall()
+        for month, count in monthly_counts:
+            logger.info(f"Pickups in {month}: {count:,} trips loaded")
 
-                # Get counts
-                current_count = self.con.execute("SELECT COUNT(*) FROM fact_trip").fetchone()[0]
-                trips_added = current_count - total_trips_loaded
-                total_trips_loaded = current_count
+        logger.info("========== DATA LOADING COMPLETE ==========")
+        logger.info(f"Loaded in {elapsed:.1f}s ({rate:,.0f} trips/sec)")
+        logger.info(f"Total trips loaded: {total_trips_loaded:,}")
+        logger.info(f"Total trips filtered: {total_trips_filtered:,}")
+        logger.info(f"Filter rate: {filter_rate:.1f}%")
 
-                # Get original count from file
-                original_count = self.con.execute(f"""
-                    SELECT COUNT(*) FROM read_parquet('{parquet_file}')
-                """).fetchone()[0]
+        self._mark_phase_complete('load_trip_data', total_trips_loaded, input_digest)
 
-                trips_filtered = original_count - trips_added
-                total_trips_filtered += trips_filtered
+    def create_indexes(self):
+        """Create the primary key and indexes once fact_trip is fully loaded"""
+        rowcount = self._fact_trip_rowcount()
+        if self._phase_complete('create_indexes', rowcount):
+            return
 
-                elapsed = time.time() - start_time
-                rate = trips_added / elapsed if elapsed > 0 else 0
+        logger.info("Creating indexes...")
 
-                print(f"[{self._timestamp()}] File processed in {elapsed:.1f}s")
-                print(f"[{self._timestamp()}] Original: {original_count:,} → Loaded: {trips_added:,} → Filtered: {trips_filtered:,} ({trips_filtered*100/original_count:.1f}%)")
-                print(f"[{self._timestamp()}] Loading rate: {rate:,.0f} trips/sec")
-                print(f"[{self._timestamp()}] Total trips so far: {total_trips_loaded:,}")
+        # Any failure leaves the phase unmarked, so the next run retries it
+        failed = False
 
+        # Added post-load rather than declared in the schema, so the bulk
+        # insert does not maintain a unique index row by row. DuckDB versions
+        # without ALTER TABLE ... ADD PRIMARY KEY get a unique index instead
+        if self._fact_trip_has_key():
+            logger.info("fact_trip trip_id key already exists")
+        else:
+            try:
+                start_time = time.time()
+                self.con.execute("ALTER TABLE fact_trip ADD PRIMARY KEY (trip_id)")
+                logger.info(f"Created fact_trip primary key in {time.time() - start_time:.1f}s")
             except Exception as e:
-                print(f"[{self._timestamp()}] ERROR processing {parquet_file.name}: {str(e)}")
-                continue
-
-        print(f"\n[{self._timestamp()}] ========== DATA LOADING COMPLETE ==========")
-        print(f"[{self._timestamp()}] Total trips loaded: {total_trips_loaded:,}")
-        print(f"[{self._timestamp()}] Total trips filtered: {total_trips_filtered:,}")
-        print(f"[{self._timestamp()}] Filter rate: {total_trips_filtered*100/(total_trips_loaded+total_trips_filtered):.1f}%")
-
-    def create_indexes(self):
-        """Create indexes for query optimization"""
-        print(f"\n[{self._timestamp()}] Creating indexes...")
+                logger.warning(f"Failed to add fact_trip primary key, using a unique index: {str(e)[:100]}")
+                try:
+                    start_time = time.time()
+                    self.con.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_trip_id ON fact_trip(trip_id)")
+                    logger.info(f"Created idx_trip_id in {time.time() - start_time:.1f}s")
+                except Exception as e:
+                    logger.error(f"Failed to create idx_trip_id: {str(e)[:100]}")
+                    failed = True
 
+        # Single-column location indexes are covered by the OD composite, and
+        # pickup_datetime/vendor_id range scans by DuckDB's zonemaps
         indexes = [
-            ("idx_pickup_datetime_btree", "fact_trip(pickup_datetime)"),
-            ("idx_pu_location", "fact_trip(pu_location_id)"),
-            ("idx_do_location", "fact_trip(do_location_id)"),
             ("idx_od_pair_covering", "fact_trip(pu_location_id, do_location_id)"),
-            ("idx_vendor_analysis", "fact_trip(vendor_id)"),
             ("idx_payment_tipping", "fact_trip(payment_type_id, tip_amount)"),
             ("idx_zone_temporal", "fact_trip(pu_location_id, pickup_date, pickup_hour)"),
+            ("idx_fare_anomaly", "fact_trip(fare_amount, tip_amount)"),
+            ("idx_airport_trips", "fact_trip(rate_code_id, airport_fee)"),
         ]
 
         for idx_name, idx_def in indexes:
             try:
-                print(f"[{self._timestamp()}] Creating {idx_name}...")
+                logger.info(f"Creating {idx_name}...")
                 start_time = time.time()
 
                 self.con.execute(f"CREATE INDEX IF NOT EXISTS {idx_name} ON {idx_def}")
 
                 elapsed = time.time() - start_time
-                print(f"[{self._timestamp()}] Created {idx_name} in {elapsed:.1f}s")
+                logger.info(f"Created {idx_name} in {elapsed:.1f}s")
             except Exception as e:
-                print(f"[{self._timestamp()}] Warning: Failed to create {idx_name}: {str(e)[:100]}")
-
-        print(f"[{self._timestamp()}] Indexes created successfully")
+                logger.warning(f"Failed to create {idx_name}: {str(e)[:100]}")
+                failed = True
 
-    def create_materialized_views(self):
-        """Create materialized views for performance"""
-        print(f"\n[{self._timestamp()}] Creating materialized views...")
-
-        # MV 1: Zone Pickup Statistics
-        print(f"[{self._timestamp()}] Creating mv_zone_pickup...")
-        start_time = time.time()
-        self.con.execute("""
-            CREATE TABLE IF NOT EXISTS mv_zone_pickup AS
-            SELECT
-                pu_location_id as location_id,
-                COUNT(*) as pickup_count,
-                AVG(fare_amount) as avg_fare,
-                AVG(trip_distance) as avg_distance,
-                AVG(trip_duration_seconds) as avg_duration,
-                PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY fare_amount) as median_fare
-            FROM fact_trip
-            WHERE fare_amount > 0 AND fare_amount < 500
-              AND trip_distance > 0
-            GROUP BY pu_location_id
-        """)
-        print(f"[{self._timestamp()}] Created mv_zone_pickup in {time.time() - start_time:.1f}s")
+        if failed:
+            logger.warning("Some indexes could not be created; create_indexes will run again next time")
+            return
 
-        # MV 2: Zone Dropoff Statistics
-        print(f"[{self._timestamp()}] Creating mv_zone_dropoff...")
-        start_time = time.time()
-        self.con.execute("""
-            CREATE TABLE IF NOT EXISTS mv_zone_dropoff AS
-            SELECT
-                do_location_id as location_id,
-                COUNT(*) as dropoff_count,
-                AVG(fare_amount) as avg_fare,
-                AVG(trip_distance) as avg_distance
-            FROM fact_trip
-            WHERE fare_amount > 0 AND fare_amount < 500
-              AND trip_distance > 0
-            GROUP BY do_location_id
-        """)
-        print(f"[{self._timestamp()}] Created mv_zone_dropoff in {time.time() - start_time:.1f}s")
+        self._mark_phase_complete('create_indexes', rowcount)
+        logger.info("Indexes created successfully")
 
-        # MV 3: Hourly Demand
-        print(f"[{self._timestamp()}] Creating mv_hourly_demand...")
-        start_time = time.time()
-        self.con.execute("""
-            CREATE TABLE IF NOT EXISTS mv_hourly_demand AS
-            SELECT
-                pickup_date,
-                pickup_hour,
-                pickup_day_of_week,
-                is_weekend,
-                COUNT(*) as trip_count,
-                AVG(fare_amount) as avg_fare,
-                SUM(total_amount) as total_revenue,
-                AVG(trip_distance) as avg_distance,
-                AVG(passenger_count) as avg_passengers
-            FROM fact_trip
-            WHERE fare_amount > 0
-            GROUP BY pickup_date, pickup_hour, pickup_day_of_week, is_weekend
-        """)
-        print(f"[{self._timestamp()}] Created mv_hourly_demand in {time.time() - start_time:.1f}s")
-
-        # MV 4: OD Flows (high volume routes only)
-        print(f"[{self._timestamp()}] Creating mv_od_flows...")
-        start_time = time.time()
-        self.con.execute("""
-            CREATE TABLE IF NOT EXISTS mv_od_flows AS
-            SELECT
-                pu_location_id,
-                do_location_id,
-                COUNT(*) as trip_count,
-                AVG(fare_amount) as avg_fare,
-                AVG(trip_distance) as avg_distance,
-                AVG(trip_duration_seconds) as avg_duration_sec,
-                PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY fare_amount) as median_fare,
-                PERCENTILE_CONT(0.9) WITHIN GROUP (ORDER BY fare_amount) as p90_fare
-            FROM fact_trip
-            WHERE fare_amount > 0
-              AND fare_amount < 500
-              AND trip_distance > 0
-            GROUP BY pu_location_id, do_location_id
-            HAVING COUNT(*) >= 100
-        """)
-        print(f"[{self._timestamp()}] Created mv_od_flows in {time.time() - start_time:.1f}s")
-
-        # MV 5: Vendor Performance
-        print(f"[{self._timestamp()}] Creating mv_vendor_performance...")
-        start_time = time.time()
-        self.con.execute("""
-            CREATE TABLE IF NOT EXISTS mv_vendor_performance AS
-            SELECT
-                vendor_id,
-                COUNT(*) as trip_count,
-                AVG(fare_amount) as avg_fare,
-                AVG(tip_amount) as avg_tip,
-                AVG(trip_distance) as avg_distance,
-                AVG(trip_duration_seconds) as avg_duration_sec,
-                SUM(CASE WHEN store_and_fwd_flag = 'Y' THEN 1 ELSE 0 END) as store_fwd_count,
-                AVG(passenger_count) as avg_passengers
-            FROM fact_trip
-            WHERE fare_amount > 0
-            GROUP BY vendor_id
-        """)
-        print(f"[{self._timestamp()}] Created mv_vendor_performance in {time.time() - start_time:.1f}s")
+    def _run_mv_job(self, statements):
+        """Run one job's (name, sql) statements in order on its own cursor"""
+        con = self.con.cursor()
+        try:
+            for name, sql in statements:
+                if name is None:
+                    con.execute(sql)
+                    continue
+                logger.info(f"Creating {name}...")
+                start_time = time.time()
+                con.execute(sql)
+                logger.info(f"Created {name} in {time.time() - start_time:.1f}s")
+        finally:
+            con.close()
 
-        # MV 6: Payment Patterns
-        print(f"[{self._timestamp()}] Creating mv_payment_patterns...")
-        start_time = time.time()
-        self.con.execute("""
-            CREATE TABLE IF NOT EXISTS mv_payment_patterns AS
-            SELECT
-                payment_type_id,
-                pickup_hour,
-                is_weekend,
-                COUNT(*) as trip_count,
-                AVG(tip_amount) as avg_tip,
-                AVG(fare_amount) as avg_fare,
-                AVG(CASE WHEN fare_amount > 0 THEN (tip_amount / fare_amount) * 100 ELSE NULL END) as avg_tip_pct,
-                SUM(CASE WHEN tip_amount > 0 THEN 1 ELSE 0 END) as trips_with_tip,
-                COUNT(*) - SUM(CASE WHEN tip_amount > 0 THEN 1 ELSE 0 END) as trips_no_tip
-            FROM fact_trip
-            WHERE fare_amount > 0 AND fare_amount < 500
-            GROUP BY payment_type_id, pickup_hour, is_weekend
-        """)
-        print(f"[{self._timestamp()}] Created mv_payment_patterns in {time.time() - start_time:.1f}s")
+    def create_materialized_views(self):
+        """Create materialized views for performance"""
+        rowcount = self._fact_trip_rowcount()
+        if self._phase_complete('create_materialized_views', rowcount):
+            return
 
-        print(f"[{self._timestamp()}] All materialized views created successfully")
+        logger.info("Creating materialized views...")
+
+        # The views are independent of each other, so they are built as a few
+        # jobs running concurrently, each on its own cursor over the shared
+        # database; DuckDB only overlaps separate queries across connections.
+        jobs = []
+
+        # MVs 1-8 are split from one multi-aggregation pass over fact_trip instead
+        # of eight separate scans. The load already restricts fact_trip to
+        # 0 < fare_amount < 500 and trip_distance > 0, so the shared filter below
+        # matches each view's original WHERE clause.
+        # trip_aggregates is a temp table and only visible to the cursor that
+        # created it, so the aggregation and its eight splits form one job.
+        jobs.append([
+            ("trip_aggregates", """
+                CREATE OR REPLACE TEMP TABLE trip_aggregates AS
+                SELECT
+                    CASE GROUPING(pu_location_id, do_location_id, pickup_date, pickup_hour,
+                                  pickup_day_of_week, is_weekend, vendor_id, payment_type_id)
+                        WHEN 127 THEN 'zone_pickup'        -- (pu_location_id)
+                        WHEN 191 THEN 'zone_dropoff'       -- (do_location_id)
+                        WHEN 195 THEN 'hourly_demand'      -- (pickup_date, pickup_hour, pickup_day_of_week, is_weekend)
+                        WHEN 63 THEN 'od_flows'            -- (pu_location_id, do_location_id)
+                        WHEN 253 THEN 'vendor'             -- (vendor_id)
+                        WHEN 234 THEN 'payment_patterns'   -- (payment_type_id, pickup_hour, is_weekend)
+                        WHEN 255 THEN 'overall'            -- ()
+                    END as grouping_set,
+                    pu_location_id,
+                    do_location_id,
+                    pickup_date,
+                    pickup_hour,
+                    pickup_day_of_week,
+                    is_weekend,
+                    vendor_id,
+                    payment_type_id,
+                    COUNT(*) as trip_count,
+                    AVG(fare_amount) as avg_fare,
+                    AVG(trip_distance) as avg_distance,
+                    AVG(trip_duration_seconds) as avg_duration_sec,
+                    AVG(tip_amount) as avg_tip,
+                    AVG(passenger_count) as avg_passengers,
+                    SUM(total_amount) as total_revenue,
+                    COUNT(*) FILTER (WHERE store_and_fwd_flag = 'Y') as store_fwd_count,
+                    AVG((tip_amount / fare_amount) * 100) FILTER (WHERE fare_amount > 0) as avg_tip_pct,
+                    COUNT(*) FILTER (WHERE tip_amount > 0) as trips_with_tip,
+                    AVG(extra) as avg_extra,
+                    AVG(mta_tax) as avg_mta_tax,
+                    AVG(tolls_amount) as avg_tolls,
+                    AVG(improvement_surcharge) as avg_improvement_surcharge,
+                    AVG(congestion_surcharge) as avg_congestion_surcharge,
+                    AVG(airport_fee) as avg_airport_fee,
+                    AVG(total_amount) as avg_total,
+                    AVG(tip_amount / NULLIF(total_amount, 0) * 100) as tip_pct_of_total,
+                    COUNT(*) FILTER (WHERE congestion_surcharge > 0) as trips_with_congestion,
+                    COUNT(*) FILTER (WHERE airport_fee > 0) as trips_with_airport_fee,
+                    COUNT(*) FILTER (WHERE tolls_amount > 0) as trips_with_tolls,
+                    -- Approximate (t-digest) quantiles stream in bounded memory, so
+                    -- they share this pass instead of needing a per-group sort
+                    APPROX_QUANTILE(fare_amount, 0.5) as median_fare,
+                    APPROX_QUANTILE(fare_amount, 0.9) as p90_fare
+                FROM fact_trip
+                WHERE fare_amount > 0 AND fare_amount < 500
+                  AND trip_distance > 0
+                GROUP BY GROUPING SETS (
+                    (pu_location_id),
+                    (do_location_id),
+                    (pickup_date, pickup_hour, pickup_day_of_week, is_weekend),
+                    (pu_location_id, do_location_id),
+                    (vendor_id),
+                    (payment_type_id, pickup_hour, is_weekend),
+                    ()
+                )
+            """),
+
+            # MV 1: Zone Pickup Statistics (zone names and is_manhattan denormalized
+            # so the API can filter without joining dim_location)
+            ("mv_zone_pickup", """
+                CREATE OR REPLACE TABLE mv_zone_pickup AS
+                SELECT
+                    a.pu_location_id as location_id,
+                    a.trip_count as pickup_count,
+                    a.avg_fare,
+                    a.avg_distance,
+                    a.avg_duration_sec as avg_duration,
+                    a.median_fare,
+                    l.zone,
+                    l.borough,
+                    COALESCE(l.borough = 'Manhattan', FALSE) as is_manhattan
+                FROM trip_aggregates a
+                LEFT JOIN dim_location l ON a.pu_location_id = l.location_id
+                WHERE a.grouping_set = 'zone_pickup'
+            """),
+
+            # MV 2: Zone Dropoff Statistics
+            ("mv_zone_dropoff", """
+                CREATE OR REPLACE TABLE mv_zone_dropoff AS
+                SELECT
+                    a.do_location_id as location_id,
+                    a.trip_count as dropoff_count,
+                    a.avg_fare,
+                    a.avg_distance,
+                    l.zone,
+                    l.borough,
+                    COALESCE(l.borough = 'Manhattan', FALSE) as is_manhattan
+                FROM trip_aggregates a
+                LEFT JOIN dim_location l ON a.do_location_id = l.location_id
+                WHERE a.grouping_set = 'zone_dropoff'
+            """),
+
+            # MV 3: Hourly Demand
+            ("mv_hourly_demand", """
+                CREATE OR REPLACE TABLE mv_hourly_demand AS
+                SELECT
+                    pickup_date,
+                    pickup_hour,
+                    pickup_day_of_week,
+                    is_weekend,
+                    trip_count,
+                    avg_fare,
+                    total_revenue,
+                    avg_distance,
+                    avg_passengers
+                FROM trip_aggregates
+                WHERE grouping_set = 'hourly_demand'
+            """),
+
+            # MV 4: OD Flows (high volume routes only)
+            ("mv_od_flows", """
+                CREATE OR REPLACE TABLE mv_od_flows AS
+                SELECT
+                    a.pu_location_id,
+                    a.do_location_id,
+                    a.trip_count,
+                    a.avg_fare,
+                    a.avg_distance,
+                    a.avg_duration_sec,
+                    a.median_fare,
+                    a.p90_fare,
+                    pu.zone as pu_zone,
+                    dropoff.zone as do_zone,
+                    COALESCE(pu.borough = 'Manhattan' AND dropoff.borough = 'Manhattan', FALSE) as is_manhattan
+                FROM trip_aggregates a
+                LEFT JOIN dim_location pu ON a.pu_location_id = pu.location_id
+                LEFT JOIN dim_location dropoff ON a.do_location_id = dropoff.location_id
+                WHERE a.grouping_set = 'od_flows'
+                  AND a.trip_count >= 100
+            """),
+
+            # MV 5: Vendor Performance
+            ("mv_vendor_performance", """
+                CREATE OR REPLACE TABLE mv_vendor_performance AS
+                SELECT
+                    vendor_id,
+                    trip_count,
+                    avg_fare,
+                    avg_tip,
+                    avg_distance,
+                    avg_duration_sec,
+                    store_fwd_count,
+                    avg_passengers
+                FROM trip_aggregates
+                WHERE grouping_set = 'vendor'
+            """),
+
+            # MV 6: Payment Patterns
+            ("mv_payment_patterns", """
+                CREATE OR REPLACE TABLE mv_payment_patterns AS
+                SELECT
+                    payment_type_id,
+                    pickup_hour,
+                    is_weekend,
+                    trip_count,
+                    avg_tip,
+                    avg_fare,
+                    avg_tip_pct,
+                    trips_with_tip,
+                    trip_count - trips_with_tip as trips_no_tip
+                FROM trip_aggregates
+                WHERE grouping_set = 'payment_patterns'
+            """),
+
+            # MV 7: Fare Breakdown (single row)
+            ("mv_fare_breakdown", """
+                CREATE OR REPLACE TABLE mv_fare_breakdown AS
+                SELECT
+                    trip_count as total_trips,
+                    avg_fare as avg_base_fare,
+                    avg_extra,
+                    avg_mta_tax,
+                    avg_tip,
+                    avg_tolls,
+                    avg_improvement_surcharge,
+                    avg_congestion_surcharge,
+                    avg_airport_fee,
+                    avg_total,
+                    tip_pct_of_total
+                FROM trip_aggregates
+                WHERE grouping_set = 'overall'
+            """),
+
+            # MV 8: Surcharge Frequency (single row)
+            ("mv_surcharge_frequency", """
+                CREATE OR REPLACE TABLE mv_surcharge_frequency AS
+                SELECT
+                    trip_count as total_trips,
+                    trips_with_congestion,
+                    trips_with_airport_fee,
+                    trips_with_tolls,
+                    trips_with_congestion * 100.0 / trip_count as congestion_pct,
+                    trips_with_airport_fee * 100.0 / trip_count as airport_fee_pct,
+                    trips_with_tolls * 100.0 / trip_count as tolls_pct
+                FROM trip_aggregates
+                WHERE grouping_set = 'overall'
+            """),
+
+            (None, "DROP TABLE trip_aggregates"),
+        ])
+
+        # MV 9: Airport vs Regular Trips
+        jobs.append([
+            ("mv_airport_comparison", """
+                CREATE OR REPLACE TABLE mv_airport_comparison AS
+                SELECT
+                    CASE
+                        WHEN rate_code_id = 2 THEN 'JFK Airport'
+                        WHEN rate_code_id = 3 THEN 'Newark Airport'
+                        WHEN airport_fee > 0 THEN 'Other Airport'
+                        ELSE 'Regular Trip'
+                    END as trip_type,
+                    COUNT(*) as trip_count,
+                    AVG(fare_amount) as avg_fare,
+                    AVG(trip_distance) as avg_distance,
+                    AVG(trip_duration_seconds / 60.0) as avg_duration_min,
+                    AVG(tip_amount) as avg_tip
+                FROM fact_trip
+                WHERE fare_amount > 0 AND fare_amount < 1000
+                GROUP BY trip_type
+            """),
+        ])
+
+        # MV 10: Tipping by Payment Type
+        jobs.append([
+            ("mv_payment_tipping", """
+                CREATE OR REPLACE TABLE mv_payment_tipping AS
+                SELECT
+                    pt.payment_type_name,
+                    pt.is_card_payment,
+                    pt.allows_tip,
+                    COUNT(*) as trip_count,
+                    COUNT(*) * 100.0 / SUM(COUNT(*)) OVER () as pct_of_trips,
+                    AVG(t.tip_amount) as avg_tip,
+                    AVG(t.fare_amount) as avg_fare,
+                    AVG((t.tip_amount / t.fare_amount) * 100) FILTER (WHERE t.fare_amount > 0) as avg_tip_pct,
+                    COUNT(*) FILTER (WHERE t.tip_amount > 0) * 100.0 / COUNT(*) as tipping_frequency_pct
+                FROM fact_trip t
+                JOIN dim_payment_type pt ON t.payment_type_id = pt.payment_type_id
+                WHERE t.fare_amount > 0 AND t.fare_amount < 500
+                GROUP BY pt.payment_type_name, pt.is_card_payment, pt.allows_tip
+            """),
+        ])
+
+        # MV 11: Anomaly Summary (single row, all counts from one scan)
+        jobs.append([
+            ("mv_anomaly_summary", """
+                CREATE OR REPLACE TABLE mv_anomaly_summary AS
+                SELECT
+                    COUNT(*) as total_trips,
+                    COUNT(*) FILTER (
+                        WHERE t.trip_distance > 0
+                          AND t.fare_amount / t.trip_distance > 50
+                          AND t.fare_amount < 1000
+                    ) as high_fare_per_mile_count,
+                    COUNT(*) FILTER (
+                        WHERE t.fare_amount > 50
+                          AND t.tip_amount = 0
+                          AND pt.allows_tip = TRUE
+                    ) as no_tip_expensive_count
+                FROM fact_trip t
+                LEFT JOIN dim_payment_type pt ON t.payment_type_id = pt.payment_type_id
+            """),
+        ])
+
+        # MV 12: High Fare-per-Mile Trips (anomalous rows only, sorted for top-K reads)
+        # Note: Uses 'dropoff' alias because 'do' is a reserved keyword in DuckDB
+        jobs.append([
+            ("mv_high_fare_trips", """
+                CREATE OR REPLACE TABLE mv_high_fare_trips AS
+                SELECT
+                    t.trip_id,
+                    t.pickup_datetime,
+                    pu.zone as pickup_zone,
+                    dropoff.zone as dropoff_zone,
+                    t.fare_amount,
+                    t.trip_distance,
+                    t.fare_amount / t.trip_distance as fare_per_mile,
+                    t.trip_duration_seconds
+                FROM fact_trip t
+                JOIN dim_location pu ON t.pu_location_id = pu.location_id
+                JOIN dim_location dropoff ON t.do_location_id = dropoff.location_id
+                WHERE t.trip_distance > 0
+                  AND t.trip_distance < 100
+                  AND t.fare_amount / t.trip_distance > 50
+                  AND t.fare_amount < 1000
+                ORDER BY fare_per_mile DESC
+            """),
+        ])
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(self._run_mv_job, job) for job in jobs]
+            for future in futures:
+                future.result()
+
+        self._mark_phase_complete('create_materialized_views', rowcount)
+        logger.info("All materialized views created successfully")
 
     def create_summary_statistics(self):
         """Create overall summary statistics"""
-        print(f"\n[{self._timestamp()}] Creating summary statistics...")
+        rowcount = self._fact_trip_rowcount()
+        if self._phase_complete('create_summary_statistics', rowcount):
+            return
+
+        logger.info("Creating summary statistics...")
 
         self.con.execute("""
-            CREATE TABLE IF NOT EXISTS summary_statistics AS
+            CREATE OR REPLACE TABLE summary_statistics AS
             SELECT
                 'overall' as metric_type,
                 COUNT(*) as total_trips,
@@ -533,62 +915,82 @@ class TaxiETLPipeline:
         """)
 
         stats = self.con.execute("SELECT * FROM summary_statistics").fetchone()
-        print(f"[{self._timestamp()}] Summary statistics created")
-        print(f"[{self._timestamp()}] Total trips: {stats[1]:,}")
-        print(f"[{self._timestamp()}] Total revenue: ${stats[4]:,.2f}")
-        print(f"[{self._timestamp()}] Avg fare: ${stats[5]:.2f}")
-        print(f"[{self._timestamp()}] Date range: {stats[9]} to {stats[10]}")
+        logger.info("Summary statistics created")
+        logger.info(f"Total trips: {stats[1]:,}")
+        logger.info(f"Total revenue: ${stats[4]:,.2f}")
+        logger.info(f"Avg fare: ${stats[5]:.2f}")
+        logger.info(f"Date range: {stats[9]} to {stats[10]}")
+
+        self._mark_phase_complete('create_summary_statistics', rowcount)
 
     def analyze_database(self):
         """Run ANALYZE to update statistics for query optimizer"""
-        print(f"\n[{self._timestamp()}] Analyzing database for query optimization...")
+        rowcount = self._fact_trip_rowcount()
+        if self._phase_complete('analyze_database', rowcount):
+            return
+
+        logger.info("Analyzing database for query optimization...")
 
         try:
             self.con.execute("ANALYZE")
-            print(f"[{self._timestamp()}] Database analysis complete")
+            self._mark_phase_complete('analyze_database', rowcount)
+            logger.info("Database analysis complete")
         except:
-            print(f"[{self._timestamp()}] Note: ANALYZE not available in this DuckDB version")
+            logger.warning("ANALYZE not available in this DuckDB version")
 
     def print_statistics(self):
         """Print final database statistics"""
-        print(f"\n[{self._timestamp()}] ========== DATABASE STATISTICS ==========")
+        logger.info("========== DATABASE STATISTICS ==========")
 
         # Table sizes
         tables = ['fact_trip', 'dim_location', 'dim_vendor', 'dim_payment_type', 'dim_rate_code',
                   'mv_zone_pickup', 'mv_zone_dropoff', 'mv_hourly_demand', 'mv_od_flows',
-                  'mv_vendor_performance', 'mv_payment_patterns']
+                  'mv_vendor_performance', 'mv_payment_patterns', 'mv_fare_breakdown',
+                  'mv_surcharge_frequency', 'mv_airport_comparison', 'mv_payment_tipping',
+                  'mv_anomaly_summary', 'mv_high_fare_trips']
 
         for table in tables:
             try:
                 count = self.con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
-                print(f"[{self._timestamp()}] {table}: {count:,} rows")
+                logger.info(f"{table}: {count:,} rows")
             except:
-                print(f"[{self._timestamp()}] {table}: not found")
+                logger.info(f"{table}: not found")
 
-        # Data quality check
-        print(f"\n[{self._timestamp()}] Data Quality:")
+        # Data quality check, read from the summary_statistics row instead of
+        # scanning fact_trip again (the load already guarantees fare_amount > 0,
+        # so its averages cover every trip)
+        logger.info("Data Quality:")
         quality = self.con.execute("""
             SELECT
-                COUNT(*) as total,
-                AVG(fare_amount) as avg_fare,
-                AVG(trip_distance) as avg_dist,
-                AVG(trip_duration_seconds / 60.0) as avg_duration_min
-            FROM fact_trip
+                avg_fare,
+                avg_distance,
+                avg_duration / 60.0 as avg_duration_min
+            FROM summary_statistics
+            WHERE metric_type = 'overall'
         """).fetchone()
 
-        print(f"[{self._timestamp()}] Average fare: ${quality[1]:.2f}")
-        print(f"[{self._timestamp()}] Average distance: {quality[2]:.2f} miles")
-        print(f"[{self._timestamp()}] Average duration: {quality[3]:.1f} minutes")
+        logger.info(f"Average fare: ${quality[0]:.2f}")
+        logger.info(f"Average distance: {quality[1]:.2f} miles")
+        logger.info(f"Average duration: {quality[2]:.1f} minutes")
 
     def close(self):
         """Close database connection"""
         if hasattr(self, 'con'):
             self.con.close()
-            print(f"\n[{self._timestamp()}] Database connection closed")
+            logger.info("Database connection closed")
 
 
 def main():
     """Main ETL execution"""
+    # The formatter stamps each record, replacing per-call strftime timestamps;
+    # stdout keeps log lines in order with the banner prints below
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[%(asctime)s] %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        stream=sys.stdout,
+    )
+
     print("="*70)
     print(" NYC TAXI DATA ANALYTICS - ETL PIPELINE")
     print("="*70)
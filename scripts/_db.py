@@ -0,0 +1,31 @@
+"""
+Shared DuckDB connection setup for the exploration scripts
+"""
+
+import os
+import sys
+import duckdb
+
+# Trips loaded once by scripts/build_trips_db.py
+TRIPS_DB = "./data/processed/trips.duckdb"
+
+
+def get_con(database=TRIPS_DB, read_only=True, preserve_insertion_order=False):
+    """Open a DuckDB connection configured the same way for every script.
+
+    Opening the trips database read-only exits with a pointer to the build
+    script if it has not been built yet.
+    """
+    if read_only and database == TRIPS_DB and not os.path.exists(TRIPS_DB):
+        sys.exit(f"{TRIPS_DB} not found. Run: python3 scripts/build_trips_db.py")
+
+    con = duckdb.connect(database, read_only=read_only)
+
+    # Use every core and keep parsed Parquet metadata cached between queries
+    con.execute(f"SET threads={os.cpu_count()}")
+    con.execute("SET memory_limit='8GB'")
+    con.execute("SET enable_object_cache=true")
+    if not preserve_insertion_order:
+        con.execute("SET preserve_insertion_order=false")  # Results are explicitly ordered
+
+    return con
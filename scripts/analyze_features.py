@@ -1,173 +1,195 @@
 import duckdb
+import pyarrow as pa
+import pyarrow.compute as pc
+from _db import get_con
 
-con = duckdb.connect()
+MONTH = "2025-01"
 
-# Use a variable for the path (easier to maintain)
-DATA_PATH = "./data/raw/yellow_tripdata_2025-01.parquet"
+con = get_con()
 
-print("=" * 60)
-print("NYC TAXI DATA ANALYSIS - JANUARY 2025")
-print("=" * 60)
+
+def run_all_stats(con, month):
+    """Compute every aggregate in this report with a single scan of the month.
+
+    Returns one Arrow table with a row per group, labelled with the grouping
+    set it came from; each section below slices its rows out locally.
+    """
+    return con.execute(
+        f"""
+        WITH base AS (
+            SELECT
+                VendorID,
+                payment_type,
+                RatecodeID,
+                passenger_count,
+                PULocationID,
+                DOLocationID,
+                fare_amount,
+                tip_amount,
+                trip_distance,
+                hour(tpep_pickup_datetime) as hour
+            FROM trips
+            WHERE source_month = '{month}'
+        ),
+        agg AS (
+            SELECT
+                CASE GROUPING(VendorID, payment_type, RatecodeID, passenger_count,
+                              hour, PULocationID, DOLocationID)
+                    WHEN 63 THEN 'vendor'            -- (VendorID)
+                    WHEN 95 THEN 'payment_type'      -- (payment_type)
+                    WHEN 111 THEN 'rate_code'        -- (RatecodeID)
+                    WHEN 119 THEN 'passenger_count'  -- (passenger_count)
+                    WHEN 123 THEN 'hour'             -- (hour)
+                    WHEN 125 THEN 'pickup'           -- (PULocationID)
+                    WHEN 126 THEN 'dropoff'          -- (DOLocationID)
+                    WHEN 127 THEN 'overall'          -- ()
+                END as grouping_set,
+                VendorID,
+                payment_type,
+                RatecodeID,
+                passenger_count,
+                hour,
+                PULocationID,
+                DOLocationID,
+                COUNT(*) as trip_count,
+                ROUND(AVG(fare_amount) FILTER (WHERE fare_amount > 0 AND fare_amount < 500), 2) as avg_fare,
+                ROUND(MIN(fare_amount) FILTER (WHERE fare_amount > 0 AND fare_amount < 500), 2) as min_fare,
+                ROUND(MAX(fare_amount) FILTER (WHERE fare_amount > 0 AND fare_amount < 500), 2) as max_fare,
+                ROUND(AVG(tip_amount) FILTER (WHERE fare_amount > 0 AND fare_amount < 500), 2) as avg_tip,
+                ROUND(AVG(trip_distance) FILTER (WHERE fare_amount > 0 AND fare_amount < 500), 2) as avg_distance,
+                COUNT(*) FILTER (WHERE fare_amount <= 0) as invalid_fares,
+                COUNT(*) FILTER (WHERE trip_distance <= 0) as invalid_distance,
+                COUNT(*) FILTER (WHERE passenger_count <= 0 OR passenger_count > 6) as invalid_passengers,
+                COUNT(*) FILTER (WHERE PULocationID IS NULL OR DOLocationID IS NULL) as null_locations
+            FROM base
+            GROUP BY GROUPING SETS (
+                (VendorID),
+                (payment_type),
+                (RatecodeID),
+                (passenger_count),
+                (hour),
+                (PULocationID),
+                (DOLocationID),
+                ()
+            )
+        ),
+        -- Every grouping set partitions the same rows, so the () row's count is
+        -- the denominator for all of the percentages
+        total AS (
+            SELECT trip_count as total_trips FROM agg WHERE grouping_set = 'overall'
+        )
+        SELECT
+            agg.*,
+            ROUND(agg.trip_count * 100.0 / total.total_trips, 2) as percentage
+        FROM agg, total
+    """
+    ).fetch_arrow_table()
+
+
+def section(stats, grouping_set, columns, sort_by=None, limit=None):
+    """Slice one report section's rows and columns out of the stats table"""
+    table = stats.filter(pc.equal(stats["grouping_set"], grouping_set)).select(columns)
+    if sort_by:
+        table = table.sort_by(sort_by)
+    if limit:
+        table = table.slice(0, limit)
+    return table
+
+
+stats = run_all_stats(con, MONTH)
+con.close()
+
+# Every section is sliced from the one Arrow table first, then the report is
+# rendered in a single pass at the end
+results = []
 
 # 1. Check Manhattan trips (LocationID filtering)
-print("\n1. LOCATION ANALYSIS")
-print("-" * 60)
-manhattan_check = con.execute(
-    f"""
-    SELECT 
-        COUNT(*) as total_trips,
-        COUNT(DISTINCT PULocationID) as unique_pickup_zones,
-        COUNT(DISTINCT DOLocationID) as unique_dropoff_zones
-    FROM '{DATA_PATH}'
-"""
-).df()
-print(manhattan_check)
+overall = section(stats, "overall", ["trip_count"])
+pickup_zones = section(stats, "pickup", ["PULocationID"])
+dropoff_zones = section(stats, "dropoff", ["DOLocationID"])
+results.append((
+    "1. LOCATION ANALYSIS",
+    pa.table({
+        "total_trips": overall["trip_count"],
+        # Distinct zones = non-NULL keys in the zone grouping sets
+        "unique_pickup_zones": [pc.count(pickup_zones["PULocationID"]).as_py()],
+        "unique_dropoff_zones": [pc.count(dropoff_zones["DOLocationID"]).as_py()],
+    }),
+))
 
 # 2. Vendor distribution
-print("\n2. VENDOR DISTRIBUTION")
-print("-" * 60)
-vendor_dist = con.execute(
-    f"""
-    SELECT 
-        VendorID,
-        COUNT(*) as trip_count,
-        ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 2) as percentage
-    FROM '{DATA_PATH}'
-    GROUP BY VendorID
-    ORDER BY trip_count DESC
-"""
-).df()
-print(vendor_dist)
+results.append((
+    "2. VENDOR DISTRIBUTION",
+    section(stats, "vendor", ["VendorID", "trip_count", "percentage"],
+            sort_by=[("trip_count", "descending")]),
+))
 
 # 3. Payment type distribution
-print("\n3. PAYMENT TYPE DISTRIBUTION")
-print("-" * 60)
-payment_dist = con.execute(
-    f"""
-    SELECT 
-        payment_type,
-        COUNT(*) as trip_count,
-        ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 2) as percentage
-    FROM '{DATA_PATH}'
-    GROUP BY payment_type
-    ORDER BY trip_count DESC
-"""
-).df()
-print(payment_dist)
+results.append((
+    "3. PAYMENT TYPE DISTRIBUTION",
+    section(stats, "payment_type", ["payment_type", "trip_count", "percentage"],
+            sort_by=[("trip_count", "descending")]),
+))
 
 # 4. Rate code distribution
-print("\n4. RATE CODE DISTRIBUTION")
-print("-" * 60)
-rate_dist = con.execute(
-    f"""
-    SELECT 
-        RatecodeID,
-        COUNT(*) as trip_count,
-        ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 2) as percentage
-    FROM '{DATA_PATH}'
-    GROUP BY RatecodeID
-    ORDER BY trip_count DESC
-"""
-).df()
-print(rate_dist)
+results.append((
+    "4. RATE CODE DISTRIBUTION",
+    section(stats, "rate_code", ["RatecodeID", "trip_count", "percentage"],
+            sort_by=[("trip_count", "descending")]),
+))
 
 # 5. Passenger count distribution
-print("\n5. PASSENGER COUNT DISTRIBUTION")
-print("-" * 60)
-passenger_dist = con.execute(
-    f"""
-    SELECT 
-        passenger_count,
-        COUNT(*) as trip_count,
-        ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER(), 2) as percentage
-    FROM '{DATA_PATH}'
-    GROUP BY passenger_count
-    ORDER BY passenger_count
-"""
-).df()
-print(passenger_dist)
+results.append((
+    "5. PASSENGER COUNT DISTRIBUTION",
+    section(stats, "passenger_count", ["passenger_count", "trip_count", "percentage"],
+            sort_by=[("passenger_count", "ascending")]),
+))
 
 # 6. Fare statistics
-print("\n6. FARE STATISTICS")
-print("-" * 60)
-fare_stats = con.execute(
-    f"""
-    SELECT 
-        ROUND(AVG(fare_amount), 2) as avg_fare,
-        ROUND(MIN(fare_amount), 2) as min_fare,
-        ROUND(MAX(fare_amount), 2) as max_fare,
-        ROUND(AVG(tip_amount), 2) as avg_tip,
-        ROUND(AVG(trip_distance), 2) as avg_distance
-    FROM '{DATA_PATH}'
-    WHERE fare_amount > 0 AND fare_amount < 500
-"""
-).df()
-print(fare_stats)
+results.append((
+    "6. FARE STATISTICS",
+    section(stats, "overall", ["avg_fare", "min_fare", "max_fare", "avg_tip", "avg_distance"]),
+))
 
 # 7. Temporal patterns (hourly)
-print("\n7. TRIPS BY HOUR OF DAY")
-print("-" * 60)
-hourly_dist = con.execute(
-    f"""
-    SELECT 
-        EXTRACT(HOUR FROM tpep_pickup_datetime) as hour,
-        COUNT(*) as trip_count
-    FROM '{DATA_PATH}'
-    GROUP BY hour
-    ORDER BY hour
-"""
-).df()
-print(hourly_dist)
+results.append((
+    "7. TRIPS BY HOUR OF DAY",
+    section(stats, "hour", ["hour", "trip_count"], sort_by=[("hour", "ascending")]),
+))
 
 # 8. Top 10 pickup locations
-print("\n8. TOP 10 PICKUP LOCATIONS")
-print("-" * 60)
-top_pickup = con.execute(
-    f"""
-    SELECT 
-        PULocationID,
-        COUNT(*) as trip_count
-    FROM '{DATA_PATH}'
-    GROUP BY PULocationID
-    ORDER BY trip_count DESC
-    LIMIT 10
-"""
-).df()
-print(top_pickup)
+results.append((
+    "8. TOP 10 PICKUP LOCATIONS",
+    section(stats, "pickup", ["PULocationID", "trip_count"],
+            sort_by=[("trip_count", "descending")], limit=10),
+))
 
 # 9. Top 10 dropoff locations
-print("\n9. TOP 10 DROPOFF LOCATIONS")
-print("-" * 60)
-top_dropoff = con.execute(
-    f"""
-    SELECT 
-        DOLocationID,
-        COUNT(*) as trip_count
-    FROM '{DATA_PATH}'
-    GROUP BY DOLocationID
-    ORDER BY trip_count DESC
-    LIMIT 10
-"""
-).df()
-print(top_dropoff)
+results.append((
+    "9. TOP 10 DROPOFF LOCATIONS",
+    section(stats, "dropoff", ["DOLocationID", "trip_count"],
+            sort_by=[("trip_count", "descending")], limit=10),
+))
 
 # 10. Data quality check
-print("\n10. DATA QUALITY CHECK")
-print("-" * 60)
-quality_check = con.execute(
-    f"""
-    SELECT 
-        COUNT(*) as total_trips,
-        SUM(CASE WHEN fare_amount <= 0 THEN 1 ELSE 0 END) as invalid_fares,
-        SUM(CASE WHEN trip_distance <= 0 THEN 1 ELSE 0 END) as invalid_distance,
-        SUM(CASE WHEN passenger_count <= 0 OR passenger_count > 6 THEN 1 ELSE 0 END) as invalid_passengers,
-        SUM(CASE WHEN PULocationID IS NULL OR DOLocationID IS NULL THEN 1 ELSE 0 END) as null_locations
-    FROM '{DATA_PATH}'
-"""
-).df()
-print(quality_check)
+results.append((
+    "10. DATA QUALITY CHECK",
+    section(stats, "overall", ["trip_count", "invalid_fares", "invalid_distance",
+                               "invalid_passengers", "null_locations"])
+    .rename_columns(["total_trips", "invalid_fares", "invalid_distance",
+                     "invalid_passengers", "null_locations"]),
+))
+
+print("=" * 60)
+print("NYC TAXI DATA ANALYSIS - JANUARY 2025")
+print("=" * 60)
+
+# DuckDB renders each Arrow table as a box table (a zero-copy scan, no pandas)
+for title, table in results:
+    print(f"\n{title}")
+    print("-" * 60)
+    duckdb.from_arrow(table).show(max_rows=100)
 
-con.close()
 print("\n" + "=" * 60)
 print("ANALYSIS COMPLETE!")
 print("=" * 60)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Build the raw trips database for the exploration scripts
+Loads every downloaded Parquet file once into a native DuckDB table, so
+explore_zones.py and analyze_features.py scan it instead of re-decoding
+the Parquet files on each run. The zone lookup is stored alongside it,
+with the Manhattan flag precomputed
+"""
+
+import os
+import time
+from _db import TRIPS_DB, get_con
+
+PARQUET_GLOB = "./data/raw/yellow_tripdata_2025-*.parquet"
+ZONES_PATH = "./data/raw/taxi_zone_lookup.csv"
+
+os.makedirs("./data/processed", exist_ok=True)
+
+print("=" * 70)
+print(" Building trips database")
+print("=" * 70)
+
+start_time = time.time()
+con = get_con(read_only=False)
+
+# Rows are clustered by month, then pickup zone, so the per-month and zone
+# filters in the exploration scripts can skip row groups on their min/max
+# statistics
+con.execute(
+    f"""
+    CREATE OR REPLACE TABLE trips AS
+    SELECT
+        regexp_extract(filename, '(\\d{{4}}-\\d{{2}})\\.parquet$', 1) as source_month,
+        * EXCLUDE (filename)
+    FROM read_parquet('{PARQUET_GLOB}', union_by_name=true, filename=true)
+    ORDER BY source_month, PULocationID, tpep_pickup_datetime
+"""
+)
+
+con.execute(
+    f"""
+    CREATE OR REPLACE TABLE zones AS
+    SELECT
+        LocationID,
+        Borough,
+        Zone,
+        service_zone,
+        Borough = 'Manhattan' as is_manhattan
+    FROM read_csv('{ZONES_PATH}')
+    ORDER BY LocationID
+"""
+)
+zone_count = con.execute("SELECT COUNT(*) FROM zones").fetchone()[0]
+print(f"✓ zones: {zone_count} zones")
+
+months = con.execute(
+    """
+    SELECT source_month, COUNT(*) as trip_count
+    FROM trips
+    GROUP BY source_month
+    ORDER BY source_month
+"""
+).fetchall()
+for month, count in months:
+    print(f"✓ {month}: {count:,} trips")
+
+con.close()
+
+print("=" * 70)
+print(f"Loaded {sum(count for _, count in months):,} trips and {zone_count} zones into {TRIPS_DB}")
+print(f"Time: {time.time() - start_time:.1f}s")
+print("=" * 70)
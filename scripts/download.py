@@ -5,8 +5,19 @@ Downloads Parquet files for the analytics project
 Note: taxi_zone_lookup.csv is already included in the repository
 """
 
+import hashlib
+import json
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+
+MAX_WORKERS = 8  # Files downloaded at once
+RANGE_PARTS = 4  # Parallel byte ranges per file
+CHUNK_SIZE = 1 << 20  # 1 MiB copy buffer
+MANIFEST_PATH = "./data/raw/SHA256SUMS"  # Digests of verified downloads
+ETAGS_PATH = "./data/raw/.etags.json"  # ETag/Last-Modified of each download
 
 # Create data directory if it doesn't exist
 os.makedirs("./data/raw", exist_ok=True)
@@ -35,43 +46,191 @@ trip_data_base = "https://d37ci6vzurychx.cloudfront.net/trip-data"
 months = ["01", "02", "03", "04", "05", "06", "07", "08", "09", "10"]
 year = "2025"
 
-for i, month in enumerate(months, 1):
+# One session for every request, so connections (and TLS) are reused
+session = requests.Session()
+adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16)
+session.mount("https://", adapter)
+session.mount("http://", adapter)
+
+
+def sha256_file(filepath):
+    """Get the hex SHA-256 digest of a file"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest():
+    """Read the digest manifest (sha256sum format) into {filename: digest}"""
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH) as f:
+        return {name: digest for digest, name in (line.split() for line in f if line.strip())}
+
+
+def save_manifest(manifest):
+    """Write the digest manifest in sha256sum format"""
+    with open(MANIFEST_PATH, "w") as f:
+        for name in sorted(manifest):
+            f.write(f"{manifest[name]}  {name}\n")
+
+
+def load_etags():
+    """Read the saved validators into {filename: {"etag": ..., "last_modified": ...}}"""
+    if not os.path.exists(ETAGS_PATH):
+        return {}
+    with open(ETAGS_PATH) as f:
+        return json.load(f)
+
+
+def save_etags(etags):
+    """Write the saved validators"""
+    with open(ETAGS_PATH, "w") as f:
+        json.dump(etags, f, indent=2, sort_keys=True)
+
+
+def validators(response):
+    """Get the cache validators a response carries"""
+    return {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+
+
+def conditional_headers(filename):
+    """Build If-None-Match/If-Modified-Since headers from a file's saved validators"""
+    saved = etags.get(filename, {})
+    headers = {}
+    if saved.get("etag"):
+        headers["If-None-Match"] = saved["etag"]
+    if saved.get("last_modified"):
+        headers["If-Modified-Since"] = saved["last_modified"]
+    return headers
+
+
+manifest = load_manifest()
+etags = load_etags()
+
+
+def download_range(url, filepath, start, end):
+    """Download bytes start..end of url into the same offsets of filepath"""
+    response = session.get(url, headers={"Range": f"bytes={start}-{end}"}, stream=True)
+    response.raise_for_status()
+    if response.status_code != 206:
+        raise RuntimeError(f"server ignored range request (HTTP {response.status_code})")
+
+    response.raw.decode_content = True
+    with open(filepath, "r+b") as f:
+        f.seek(start)
+        shutil.copyfileobj(response.raw, f, length=CHUNK_SIZE)
+
+
+def download_one(i, month):
+    """Download one month's Parquet file, split into byte ranges when possible"""
     filename = f"yellow_tripdata_{year}-{month}.parquet"
     url = f"{trip_data_base}/{filename}"
     filepath = f"./data/raw/{filename}"
 
-    # Check if already exists
+    # Check if already exists; a file that no longer matches its recorded
+    # digest (truncated or corrupted) is downloaded again
+    head = None
     if os.path.exists(filepath):
-        size_mb = os.path.getsize(filepath) / (1024 * 1024)
-        print(f"✓ [{i:2d}/10] {filename:45s} {size_mb:6.1f} MB (exists)")
-        continue
+        digest = sha256_file(filepath)
+        recorded = manifest.get(filename)
+        if recorded is None or recorded == digest:
+            # Conditional HEAD: 304 means the CDN copy hasn't changed since our
+            # download. A 200 (e.g. from a server that ignores If-None-Match on
+            # HEAD) still counts as unchanged when its size matches and its
+            # validators equal the saved ones, or when none were saved yet.
+            # Only then is the digest of a file missing from the manifest
+            # recorded. If the CDN can't be reached, the local copy is kept as
+            # is (and stays unrecorded)
+            size = os.path.getsize(filepath)
+            try:
+                head = session.head(url, headers=conditional_headers(filename),
+                                    allow_redirects=True)
+            except requests.RequestException:
+                head = None
+            changed = head is not None and head.status_code == 200 and (
+                int(head.headers.get("content-length", -1)) != size
+                or (filename in etags and validators(head) != etags[filename])
+            )
+            if not changed:
+                if head is not None and head.status_code == 200:
+                    manifest[filename] = digest
+                    etags[filename] = validators(head)
+                status = "exists" if filename in manifest else "exists, unverified"
+                print(f"✓ [{i:2d}/10] {filename:45s} {size / (1024 * 1024):6.1f} MB ({status})")
+                return
+            # The old copy stays in place until the new one replaces it
+            print(f"  [{i:2d}/10] {filename} differs from the CDN copy, downloading again")
+        else:
+            print(f"  [{i:2d}/10] {filename} failed its checksum, downloading again")
+            os.remove(filepath)
+
+    # Written under a .part name and renamed when complete, so an interrupted
+    # download never leaves a truncated file at the final path
+    partpath = filepath + ".part"
 
     print(f"  [{i:2d}/10] Downloading {filename}...")
     try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
+        # The freshness check's HEAD already describes the new file
+        if head is None or head.status_code != 200:
+            head = session.head(url, allow_redirects=True)
+            head.raise_for_status()
 
         # Get file size
-        total_size = int(response.headers.get("content-length", 0))
-
-        with open(filepath, "wb") as f:
-            downloaded = 0
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-                downloaded += len(chunk)
-                # Show progress
-                if total_size > 0:
-                    percent = (downloaded / total_size) * 100
-                    mb_downloaded = downloaded / (1024 * 1024)
-                    mb_total = total_size / (1024 * 1024)
-                    print(f"          Progress: {percent:.1f}% ({mb_downloaded:.1f}/{mb_total:.1f} MB)", end="\r")
+        total_size = int(head.headers.get("content-length", 0))
+
+        if head.headers.get("accept-ranges") == "bytes" and total_size > 0:
+            # Allocate the whole file, then fill its ranges concurrently
+            with open(partpath, "wb") as f:
+                f.truncate(total_size)
+
+            part_size = -(-total_size // RANGE_PARTS)
+            with ThreadPoolExecutor(max_workers=RANGE_PARTS) as executor:
+                futures = [
+                    executor.submit(download_range, url, partpath, start,
+                                    min(start + part_size, total_size) - 1)
+                    for start in range(0, total_size, part_size)
+                ]
+                for future in futures:
+                    future.result()
+        else:
+            response = session.get(url, stream=True)
+            response.raise_for_status()
+
+            response.raw.decode_content = True
+            with open(partpath, "wb") as f:
+                shutil.copyfileobj(response.raw, f, length=CHUNK_SIZE)
+
+        # Flush to disk before the rename, so a crash can't expose an
+        # incomplete file under the final name
+        with open(partpath, "r+b") as f:
+            os.fsync(f.fileno())
+        os.replace(partpath, filepath)
+
+        manifest[filename] = sha256_file(filepath)
+        etags[filename] = validators(head)
 
         size_mb = os.path.getsize(filepath) / (1024 * 1024)
         print(f"  ✓ [{i:2d}/10] {filename:45s} {size_mb:6.1f} MB")
 
     except Exception as e:
+        # Don't leave a partial file behind
+        if os.path.exists(partpath):
+            os.remove(partpath)
         print(f"  ✗ [{i:2d}/10] Error downloading {filename}: {e}")
 
+
+with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+    list(executor.map(download_one, range(1, len(months) + 1), months))
+
+save_manifest(manifest)
+save_etags(etags)
+
 print()
 print("=" * 70)
 print(" Download Summary")
@@ -1,50 +1,69 @@
-import duckdb
-import pandas as pd
+from _db import get_con
 
-# Connect to DuckDB (in-memory for now)
-con = duckdb.connect()
+# Use a variable for the path (easier to maintain)
+DATA_PATH = "./data/raw/yellow_tripdata_2025-01.parquet"
 
-# Read the parquet file
+# Connect to DuckDB (in-memory; this script inspects the raw file itself).
+# Insertion order is kept so the preview shows the file's first rows
+con = get_con(":memory:", read_only=False, preserve_insertion_order=True)
+
+# One view over the file, so every query below resolves the same scan
+con.execute(f"CREATE VIEW trips AS SELECT * FROM read_parquet('{DATA_PATH}')")
+
+# Read the parquet file (the trip fields the ETL loads plus cbd_congestion_fee,
+# so the scan skips any other column chunks)
 print("Loading data...")
-df = con.execute(
+df = con.sql(
     """
-    SELECT * FROM '/Users/sam/Documents/School/Emory/CS554_Database Systems/Project/NYC-Taxi-Trip-Data-Analytics-Portal/data/raw/yellow_tripdata_2025-01.parquet'
+    SELECT
+        VendorID, tpep_pickup_datetime, tpep_dropoff_datetime, passenger_count,
+        trip_distance, RatecodeID, store_and_fwd_flag, PULocationID, DOLocationID,
+        payment_type, fare_amount, extra, mta_tax, tip_amount, tolls_amount,
+        improvement_surcharge, total_amount, congestion_surcharge, Airport_fee,
+        cbd_congestion_fee
+    FROM trips
     LIMIT 10
 """
-).df()
+)
 
 print("\n=== FIRST 10 ROWS ===")
 print(df)
 
 # Get column names and types
 print("\n=== COLUMN NAMES AND TYPES ===")
-schema = con.execute(
+schema = con.sql("DESCRIBE trips")
+schema.show(max_rows=100)
+
+# Row count and date range straight from the Parquet footer: the file
+# metadata holds the row count and every row group stores min/max statistics
+# for tpep_pickup_datetime, so no data pages are read
+count = con.execute(
+    "SELECT num_rows FROM parquet_file_metadata(?)", [DATA_PATH]
+).fetchone()[0]
+first_trip, last_trip = con.execute(
     """
-    DESCRIBE SELECT * FROM '/Users/sam/Documents/School/Emory/CS554_Database Systems/Project/NYC-Taxi-Trip-Data-Analytics-Portal/data/raw/yellow_tripdata_2025-01.parquet'
-"""
-).df()
-print(schema)
+    SELECT
+        MIN(stats_min_value::TIMESTAMP) as first_trip,
+        MAX(stats_max_value::TIMESTAMP) as last_trip
+    FROM parquet_metadata(?)
+    WHERE path_in_schema = 'tpep_pickup_datetime'
+""",
+    [DATA_PATH],
+).fetchone()
+
+# Files written without statistics fall back to scanning the column
+if first_trip is None:
+    first_trip, last_trip = con.execute(
+        "SELECT MIN(tpep_pickup_datetime), MAX(tpep_pickup_datetime) FROM trips"
+    ).fetchone()
 
 # Get basic statistics
 print("\n=== TOTAL NUMBER OF ROWS ===")
-count = con.execute(
-    """
-    SELECT COUNT(*) as total_trips 
-    FROM '/Users/sam/Documents/School/Emory/CS554_Database Systems/Project/NYC-Taxi-Trip-Data-Analytics-Portal/data/raw/yellow_tripdata_2025-01.parquet'
-"""
-).fetchone()[0]
 print(f"Total trips in January 2025: {count:,}")
 
 # Get date range
 print("\n=== DATE RANGE ===")
-date_range = con.execute(
-    """
-    SELECT 
-        MIN(tpep_pickup_datetime) as first_trip,
-        MAX(tpep_pickup_datetime) as last_trip
-    FROM '/Users/sam/Documents/School/Emory/CS554_Database Systems/Project/NYC-Taxi-Trip-Data-Analytics-Portal/data/raw/yellow_tripdata_2025-01.parquet'
-"""
-).df()
-print(date_range)
+print(f"First trip: {first_trip}")
+print(f"Last trip:  {last_trip}")
 
 con.close()
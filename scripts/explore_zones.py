@@ -1,108 +1,126 @@
-import pandas as pd
-import duckdb
+from _db import get_con
 
-# Load the zone lookup
+MONTH = "2025-01"
+
+# The zone lookup is stored next to the trips by build_trips_db.py
 print("Loading taxi zone lookup...")
-zone_df = pd.read_csv("./data/raw/taxi_zone_lookup.csv")
+con = get_con()
 
 print("\n=== ZONE DATA OVERVIEW ===")
-print(f"Total zones: {len(zone_df)}")
-print(f"\nColumns: {zone_df.columns.tolist()}")
+print(f"Total zones: {con.execute('SELECT COUNT(*) FROM zones').fetchone()[0]}")
+print(f"\nColumns: {con.table('zones').columns}")
 
 print("\n=== FIRST 10 ZONES ===")
-print(zone_df.head(10))
+print(con.sql("SELECT * FROM zones ORDER BY LocationID LIMIT 10"))
 
 print("\n=== BOROUGH DISTRIBUTION ===")
-print(zone_df["Borough"].value_counts())
+print(con.sql("SELECT Borough, COUNT(*) as count FROM zones GROUP BY Borough ORDER BY count DESC"))
 
 print("\n=== MANHATTAN ZONES ===")
-manhattan_zones = zone_df[zone_df["Borough"] == "Manhattan"]
+manhattan_zones = con.sql(
+    "SELECT LocationID, Borough, Zone FROM zones WHERE is_manhattan ORDER BY LocationID"
+)
 print(f"Total Manhattan zones: {len(manhattan_zones)}")
 print("\nAll Manhattan zones:")
-print(manhattan_zones[["LocationID", "Borough", "Zone"]].to_string())
+manhattan_zones.show(max_rows=100)
 
 # Now let's see what percentage of trips are Manhattan
-con = duckdb.connect()
-
-DATA_PATH = "./data/raw/yellow_tripdata_2025-01.parquet"
 
-# Get Manhattan LocationIDs as a list
-manhattan_ids = manhattan_zones["LocationID"].tolist()
+# Boolean lookup indexed by LocationID (ids are small ints), so membership is
+# one list index per row instead of a join probe. DuckDB lists are 1-based;
+# out-of-range or NULL ids give NULL, which counts as not Manhattan
+max_id, manhattan_ids = con.execute(
+    "SELECT MAX(LocationID), list(LocationID) FILTER (WHERE is_manhattan) FROM zones"
+).fetchone()
+is_manhattan = [False] * (max_id + 1)
+for location_id in manhattan_ids:
+    is_manhattan[location_id] = True
 
 print("\n" + "=" * 60)
 print("MANHATTAN TRIP ANALYSIS")
 print("=" * 60)
 
-# Check pickup in Manhattan
-manhattan_pickup = con.execute(
+# One scan for all of the counts below: the () set gives the totals and the
+# (PULocationID, DOLocationID) set gives the routes
+con.execute(
     f"""
+    CREATE OR REPLACE TEMP TABLE manhattan_stats AS
+    WITH flagged AS (
+        SELECT
+            PULocationID,
+            DOLocationID,
+            $is_manhattan[PULocationID + 1] as pu_in,
+            $is_manhattan[DOLocationID + 1] as do_in
+        FROM trips
+        WHERE source_month = '{MONTH}'
+    )
+    SELECT
+        GROUPING(PULocationID, DOLocationID) = 0 as is_route,
+        PULocationID,
+        DOLocationID,
+        COUNT(*) as trip_count,
+        COUNT(*) FILTER (WHERE pu_in) as manhattan_pickup,
+        COUNT(*) FILTER (WHERE do_in) as manhattan_dropoff,
+        COUNT(*) FILTER (WHERE pu_in AND do_in) as both_manhattan,
+        COUNT(*) FILTER (WHERE pu_in OR do_in) as either_manhattan
+    FROM flagged
+    GROUP BY GROUPING SETS ((), (PULocationID, DOLocationID))
+""",
+    {"is_manhattan": is_manhattan},
+)
+
+# Printed as DuckDB relations, without building pandas DataFrames
+totals = con.sql(
+    """
     SELECT 
-        COUNT(*) as total_trips,
-        SUM(CASE WHEN PULocationID IN ({','.join(map(str, manhattan_ids))}) THEN 1 ELSE 0 END) as manhattan_pickup,
-        ROUND(SUM(CASE WHEN PULocationID IN ({','.join(map(str, manhattan_ids))}) THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as pickup_percentage
-    FROM '{DATA_PATH}'
+        trip_count as total_trips,
+        manhattan_pickup,
+        ROUND(manhattan_pickup * 100.0 / trip_count, 2) as pickup_percentage,
+        manhattan_dropoff,
+        ROUND(manhattan_dropoff * 100.0 / trip_count, 2) as dropoff_percentage,
+        both_manhattan,
+        ROUND(both_manhattan * 100.0 / trip_count, 2) as both_percentage,
+        either_manhattan,
+        ROUND(either_manhattan * 100.0 / trip_count, 2) as either_percentage
+    FROM manhattan_stats
+    WHERE NOT is_route
 """
-).df()
+)
+
+# Check pickup in Manhattan
+manhattan_pickup = totals.project("total_trips, manhattan_pickup, pickup_percentage")
 print("\nPickup in Manhattan:")
 print(manhattan_pickup)
 
 # Check dropoff in Manhattan
-manhattan_dropoff = con.execute(
-    f"""
-    SELECT 
-        COUNT(*) as total_trips,
-        SUM(CASE WHEN DOLocationID IN ({','.join(map(str, manhattan_ids))}) THEN 1 ELSE 0 END) as manhattan_dropoff,
-        ROUND(SUM(CASE WHEN DOLocationID IN ({','.join(map(str, manhattan_ids))}) THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as dropoff_percentage
-    FROM '{DATA_PATH}'
-"""
-).df()
+manhattan_dropoff = totals.project("total_trips, manhattan_dropoff, dropoff_percentage")
 print("\nDropoff in Manhattan:")
 print(manhattan_dropoff)
 
 # Both pickup AND dropoff in Manhattan
-both_manhattan = con.execute(
-    f"""
-    SELECT 
-        COUNT(*) as both_manhattan,
-        ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM '{DATA_PATH}'), 2) as percentage
-    FROM '{DATA_PATH}'
-    WHERE PULocationID IN ({','.join(map(str, manhattan_ids))})
-      AND DOLocationID IN ({','.join(map(str, manhattan_ids))})
-"""
-).df()
+both_manhattan = totals.project("both_manhattan, both_percentage as percentage")
 print("\nBoth pickup AND dropoff in Manhattan:")
 print(both_manhattan)
 
 # Either pickup OR dropoff in Manhattan
-either_manhattan = con.execute(
-    f"""
-    SELECT 
-        COUNT(*) as either_manhattan,
-        ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM '{DATA_PATH}'), 2) as percentage
-    FROM '{DATA_PATH}'
-    WHERE PULocationID IN ({','.join(map(str, manhattan_ids))})
-       OR DOLocationID IN ({','.join(map(str, manhattan_ids))})
-"""
-).df()
+either_manhattan = totals.project("either_manhattan, either_percentage as percentage")
 print("\nEither pickup OR dropoff in Manhattan:")
 print(either_manhattan)
 
 # Top 10 Manhattan-to-Manhattan routes
 print("\n=== TOP 10 MANHATTAN-TO-MANHATTAN ROUTES ===")
-top_routes = con.execute(
-    f"""
+top_routes = con.sql(
+    """
     SELECT 
         PULocationID,
         DOLocationID,
-        COUNT(*) as trip_count
-    FROM '{DATA_PATH}'
-    WHERE PULocationID IN ({','.join(map(str, manhattan_ids))})
-      AND DOLocationID IN ({','.join(map(str, manhattan_ids))})
-    GROUP BY PULocationID, DOLocationID
+        trip_count
+    FROM manhattan_stats
+    WHERE is_route AND both_manhattan > 0
     ORDER BY trip_count DESC
     LIMIT 10
 """
-).df()
+)
 print(top_routes)
 
 con.close()